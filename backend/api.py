@@ -4,25 +4,30 @@ FastAPI-based REST API for YOLO object detection.
 Supports image upload, video stream, and live webcam detection.
 """
 
-from fastapi import FastAPI, File, UploadFile, WebSocket, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response
+import time
+# Start of the startup timing breakdown (see /ready)
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import torch
-
-# Monkeypatch ultralytics torch_safe_load to disable weights_only=True
-# This avoids the need to allowlist dozens of custom classes in PyTorch 2.6+
-import ultralytics.nn.tasks as ultralytics_tasks
-_original_torch_safe_load = ultralytics_tasks.torch_safe_load
-
-def torch_safe_load_patched(file):
-    """Load checkpoint without weights_only restriction (trusted source)."""
-    return torch.load(file, map_location='cpu', weights_only=False), file
 
-ultralytics_tasks.torch_safe_load = torch_safe_load_patched
+# torch and ultralytics are imported by the background model load, not here (see loader.py)
+from loader import (
+    ENGINE_PYTORCH,
+    EXPORT_IMGSZ,
+    FASTLOAD_SUFFIX,
+    check_engine,
+    ensure_export,
+    ensure_fastload,
+    import_backend,
+    load_model,
+    model_nbytes,
+    warmup,
+)
 
 import io
 from pathlib import Path
@@ -32,7 +37,38 @@ from datetime import datetime
 import os
 import base64
 import uuid
-from typing import Dict, List
+import threading
+from typing import Dict, List, Optional
+
+from batching import MicroBatcher
+from executor import InferenceExecutor, QueueFullError
+from procpool import SharedMemoryModelPool
+from video import MODE_SKIP, MODES as VIDEO_MODES, InvalidVideoError, process_video
+from uploads import UploadLimitMiddleware, map_upload, spool_temp, spool_upload
+from jobs import COMPLETED, Job, JobManager
+from cache import DetectionCache, model_fingerprint
+import detections as detection_formats
+from render import is_record, record_filename, render_record, save_record, source_filename
+from stream_protocol import BINARY_SUBPROTOCOL, encode_frame
+from ingest import LatestFrameSlot
+from pacing import AdaptivePacer
+from broadcast import END, FrameBroadcaster
+from gating import MotionGate
+from registry import ModelEntry, ModelRegistry, UnknownModelError
+from slicing import MERGE_METHODS, MERGE_NMS, detect_sliced
+from bulk import BulkItem, iter_images
+from delivery import serve_file
+from preprocess import FramePool, letterbox_into, prepare
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    FRAMES_DROPPED,
+    FRAMES_TOTAL,
+    IMAGES_TOTAL,
+    REGISTRY as metrics_registry,
+    STAGE_SECONDS,
+    MetricsMiddleware,
+)
+from results_index import KIND_CACHE, KIND_IMAGE, KIND_RECORD, KIND_SOURCE, KIND_VIDEO, ResultIndex
 
 # Initialize FastAPI app
 app = FastAPI(title="YOLO Object Detection API", version="1.0.0")
@@ -49,43 +85,377 @@ app.add_middleware(
 # Use a relative results directory so it works on Render (not hardcoded Windows path)
 MODEL_PATH = Path(__file__).parent / "weights" / "final.pt"
 
-# Defer model loading to startup so we can prepare safe globals first and fail cleanly
-model = None
+# Named models: every weights/*.pt under its file stem, plus MODELS="name=path,..." entries.
+# Requests pick one with ?model= (default: the stem of MODEL_PATH, i.e. "final"). Models are
+# loaded on first use; once resident models exceed MODEL_MEMORY_MB the least recently used
+# idle ones are evicted (see registry.py). The default model is loaded at startup and pinned.
+DEFAULT_MODEL = MODEL_PATH.stem
+MODEL_MEMORY_MB = float(os.getenv("MODEL_MEMORY_MB", "2048"))
 
-@app.on_event("startup")
-def load_model_event():
-    global model
+# Inference engine: pytorch, torchscript, onnx or openvino (see loader.py)
+MODEL_ENGINE = os.getenv("MODEL_ENGINE", ENGINE_PYTORCH)
+
+# Optional multi-process mode: MODEL_WORKERS > 0 runs the default model in that many worker
+# processes fed through shared-memory ring buffers instead of in the API process.
+# Set INFERENCE_WORKERS >= MODEL_WORKERS so enough requests are in flight to keep them busy.
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "0"))
+MODEL_WORKER_SLOTS = int(os.getenv("MODEL_WORKER_SLOTS", "4"))
+MODEL_WORKER_SLOT_MB = float(os.getenv("MODEL_WORKER_SLOT_MB", "32"))
+MODEL_WORKER_THREADS = int(os.getenv("MODEL_WORKER_THREADS", "0"))
+
+# Benchmarking without weights: STUB_MODEL_MS=<ms per image> replaces every model with a
+# stand-in that sleeps and returns fixed synthetic boxes (see benchmark.py)
+STUB_MODEL_MS = os.getenv("STUB_MODEL_MS")
+
+def discover_models() -> Dict[str, Path]:
+    """Model name -> weights path for every model requests may select"""
+    paths = {
+        path.stem: path
+        for path in sorted(MODEL_PATH.parent.glob("*.pt"))
+        if not path.name.endswith(FASTLOAD_SUFFIX)
+    }
+    paths[DEFAULT_MODEL] = MODEL_PATH
+    for item in os.getenv("MODELS", "").split(","):
+        name, _, path = item.partition("=")
+        if name.strip() and path.strip():
+            paths[name.strip()] = Path(path.strip())
+    return paths
+
+def load_entry(name: str, path: Path) -> ModelEntry:
+    """
+    Load one registry model (blocking); runs on a worker thread.
+    Records how long each step took (ms) in the entry's info.
+    """
+    if STUB_MODEL_MS is not None:
+        from benchmark import stub_entry
+        return stub_entry(name, path, float(STUB_MODEL_MS))
     try:
-        model = YOLO(str(MODEL_PATH))
+        check_engine(MODEL_ENGINE)
+        info = {"artifact": None, "import_ms": None, "export_ms": None, "load_ms": None, "warmup_ms": None}
+        info["import_ms"] = round(import_backend() * 1000, 1)
+        # Export (or validate the cached export / fast-load copy) once, before any worker loads it
+        start = time.perf_counter()
+        if MODEL_ENGINE != ENGINE_PYTORCH:
+            info["artifact"] = str(ensure_export(path, MODEL_ENGINE))
+        else:
+            info["artifact"] = str(ensure_fastload(path))
+        info["export_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        # Engines may differ in preprocessing, so their results are cached separately
+        fingerprint = model_fingerprint(path)
+        if MODEL_WORKERS > 0 and name == DEFAULT_MODEL:
+            pool = SharedMemoryModelPool(
+                path,
+                num_workers=MODEL_WORKERS,
+                slots_per_worker=MODEL_WORKER_SLOTS,
+                slot_mb=MODEL_WORKER_SLOT_MB,
+                torch_threads=MODEL_WORKER_THREADS,
+                engine=MODEL_ENGINE,
+            )
+            start = time.perf_counter()
+            pool.start()  # workers load and warm up before reporting ready
+            info["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            # Each worker holds its own copy of the model
+            nbytes = MODEL_WORKERS * Path(info["artifact"]).stat().st_size
+            return ModelEntry(name, path, pool, MODEL_ENGINE, nbytes, fingerprint, concurrent=True, info=info)
+        start = time.perf_counter()
+        model = load_model(path, MODEL_ENGINE)
+        info["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        info["warmup_ms"] = round(warmup(model), 1)
+        return ModelEntry(name, path, model, MODEL_ENGINE, model_nbytes(model), fingerprint, info=info)
     except Exception as e:
-        # Re-raise with context so deployment logs show why startup failed
-        raise RuntimeError(f"Failed to load model {MODEL_PATH}: {e}") from e
+        # Re-raise with context so deployment logs show why loading failed
+        raise RuntimeError(f"Failed to load model {path}: {e}") from e
 
 # Configuration
 CONFIDENCE_THRESHOLD = 0.5
 MAX_DETECTIONS = 100
+# Micro-batching for /detect/image: concurrent requests are coalesced for up to
+# BATCH_MAX_WAIT_MS (or until BATCH_MAX_SIZE images are waiting) into one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+# Blocking work (decode, inference, plot, encode) runs on a bounded thread pool.
+# Once INFERENCE_MAX_QUEUE jobs are waiting, new requests get a 503 with Retry-After. Images
+# waiting in a micro-batch count as waiting jobs, so they are admitted or rejected one by one.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "16"))
+# Video pipeline: sampled frames per forward pass and frames buffered between stages
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "4"))
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", "16"))
+# Background video jobs (/jobs/video): parallel jobs per node and how many may wait
+JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "16"))
+# Seconds between per-connection stats messages on /ws/detect
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "1"))
+# Live webcam pacing: target frame rate and optional per-frame latency budget (ms)
+WEBCAM_TARGET_FPS = float(os.getenv("WEBCAM_TARGET_FPS", "30"))
+WEBCAM_LATENCY_BUDGET_MS = float(os.getenv("WEBCAM_LATENCY_BUDGET_MS", "0")) or None
+# Skip inference on frames that differ from the last inferred one by less than this
+# (mean absolute difference of a small grayscale thumbnail, 0-1); 0 disables the gate.
+# Default for /detect/video, /jobs/video and /ws/detect; the shared webcam producer
+# uses WEBCAM_MOTION_THRESHOLD.
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0"))
+WEBCAM_MOTION_THRESHOLD = float(os.getenv("WEBCAM_MOTION_THRESHOLD", "0"))
+# Frames buffered per live viewer before it starts skipping
+WEBCAM_VIEWER_QUEUE = int(os.getenv("WEBCAM_VIEWER_QUEUE", "2"))
 # Results directory under the project so it exists on Render and locally
 RESULTS_DIR = Path(__file__).parent.parent / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+# Results expire this long after they are written (or last hit in the result cache). The
+# index lives in RESULTS_DIR unless RESULT_INDEX_PATH says otherwise; point every API
+# process at the same one. Expired files are deleted every RESULT_REAP_INTERVAL seconds.
+RESULT_TTL_MINUTES = float(os.getenv("RESULT_TTL_MINUTES", "30"))
+RESULT_INDEX_PATH = os.getenv("RESULT_INDEX_PATH") or None
+RESULT_REAP_INTERVAL = float(os.getenv("RESULT_REAP_INTERVAL", "60"))
+# Behind nginx, set DOWNLOAD_ACCEL_PREFIX to an internal location aliased to RESULTS_DIR
+# (see nginx.conf) and /download answers with an X-Accel-Redirect: nginx sends the bytes
+# and the API process is free as soon as the headers are out
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "")
+
+# Upload size limits, enforced while the body streams in (nginx allows up to 100M)
+MAX_IMAGE_UPLOAD_MB = int(os.getenv("MAX_IMAGE_UPLOAD_MB", "25"))
+MAX_VIDEO_UPLOAD_MB = int(os.getenv("MAX_VIDEO_UPLOAD_MB", "100"))
+MAX_IMAGE_UPLOAD_BYTES = MAX_IMAGE_UPLOAD_MB * 1024 * 1024
+MAX_VIDEO_UPLOAD_BYTES = MAX_VIDEO_UPLOAD_MB * 1024 * 1024
+# /detect/bulk: whole request (all files and archives together)
+MAX_BULK_UPLOAD_MB = int(os.getenv("MAX_BULK_UPLOAD_MB", "100"))
+MAX_BULK_UPLOAD_BYTES = MAX_BULK_UPLOAD_MB * 1024 * 1024
+# Images of one bulk request decoded or waiting on the model at once; bounds its memory
+# and gives the micro-batcher enough to fill batches
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "16"))
+# Image uploads are spooled to anonymous temp files here (default: system temp dir)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/detect/image": MAX_IMAGE_UPLOAD_BYTES,
+        "/detect/video": MAX_VIDEO_UPLOAD_BYTES,
+        "/jobs/video": MAX_VIDEO_UPLOAD_BYTES,
+        "/detect/bulk": MAX_BULK_UPLOAD_BYTES,
+    },
+)
+
+# Request counts, latency and in-flight gauge for /metrics; outermost, so it times everything
+app.add_middleware(MetricsMiddleware)
+
+job_manager = JobManager(max_concurrent=JOB_MAX_CONCURRENT, max_pending=JOB_MAX_PENDING)
+
+# Content-addressed cache for /detect/image keyed by upload hash + confidence + model hash.
+# RESULT_CACHE_MB bounds the in-memory tier; RESULT_CACHE_DISK=1 also keeps entries in RESULTS_DIR.
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "64"))
+RESULT_CACHE_DISK = os.getenv("RESULT_CACHE_DISK", "0") == "1"
+# Detections-only mode: with annotate=false (or ANNOTATE_DEFAULT=0) /detect/image keeps the raw
+# upload and a compact detection record; the annotated image is drawn on first download
+ANNOTATE_DEFAULT = os.getenv("ANNOTATE_DEFAULT", "1") == "1"
+# Sliced inference (/detect/image?sliced=true) for high-resolution images: tile size (px),
+# fraction of overlap between neighbouring tiles and tiles per forward pass are the
+# per-request defaults. Boxes from different tiles are merged when their intersection
+# over the smaller box reaches SLICE_MERGE_THRESHOLD. SLICE_FULL_IMAGE=1 also runs the
+# downscaled whole image so objects larger than a tile are kept in one piece.
+SLICE_TILE_SIZE = int(os.getenv("SLICE_TILE_SIZE", "640"))
+SLICE_OVERLAP = float(os.getenv("SLICE_OVERLAP", "0.2"))
+SLICE_BATCH_SIZE = int(os.getenv("SLICE_BATCH_SIZE", "8"))
+SLICE_MERGE_THRESHOLD = float(os.getenv("SLICE_MERGE_THRESHOLD", "0.5"))
+SLICE_FULL_IMAGE = os.getenv("SLICE_FULL_IMAGE", "1") == "1"
+# Requests that only return detections (not annotated, not sliced) decode uploads straight to the
+# model input size: reduced-resolution JPEG decoding, then one resize into a pooled buffer (see
+# preprocess.py). Boxes are mapped back to the original image. FAST_DECODE=0 decodes at full size.
+FAST_DECODE = os.getenv("FAST_DECODE", "1") == "1"
+
+result_cache = DetectionCache(
+    max_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+    results_dir=RESULTS_DIR,
+    disk=RESULT_CACHE_DISK,
+)
+
+# Reusable model-input buffers for the fast decode path; the micro-batched models use the
+# default 640 px input, the same size exported graphs are built for
+frame_pool = FramePool(EXPORT_IMGSZ)
+
+# file_id -> stored files, shared by all API processes (see results_index.py)
+result_index = ResultIndex(RESULTS_DIR, RESULT_TTL_MINUTES * 60, db_path=RESULT_INDEX_PATH)
+reaper_task: Optional[asyncio.Task] = None
+
+# One shared live producer per (camera index, model name), see get_webcam_broadcaster
+webcam_broadcasters: Dict[tuple, FrameBroadcaster] = {}
+
+inference_executor = InferenceExecutor(max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_MAX_QUEUE)
+
+async def start_entry(entry: ModelEntry):
+    """Give a freshly loaded model its own micro-batcher"""
+    entry.batcher = MicroBatcher(
+        entry.predict_batch,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        run_blocking=inference_executor.run,
+        # Callers are admitted one by one, so a full queue never fails a whole batch
+        reserve=inference_executor.reserve,
+        unreserve=inference_executor.unreserve,
+    )
+    await entry.batcher.start()
+
+async def stop_entry(entry: ModelEntry):
+    """Stop an evicted model's batcher and free its workers"""
+    await entry.batcher.stop()
+    if isinstance(entry.model, SharedMemoryModelPool):
+        await asyncio.to_thread(entry.model.close)
+
+model_registry = ModelRegistry(
+    discover_models(),
+    default=DEFAULT_MODEL,
+    budget_bytes=int(MODEL_MEMORY_MB * 1024 * 1024),
+    load=load_entry,
+    start=start_entry,
+    stop=stop_entry,
+)
+
+# Values other components already track, read when /metrics is scraped
+metrics_registry.gauge(
+    "yolo_inference_queue_depth", "Jobs waiting for an inference worker", fn=lambda: inference_executor.depth,
+)
+metrics_registry.gauge(
+    "yolo_inference_running", "Jobs running on the inference workers",
+    fn=lambda: inference_executor.stats()["running"],
+)
+metrics_registry.counter(
+    "yolo_inference_rejected_total", "Jobs refused because the inference queue was full",
+    fn=lambda: inference_executor.rejected,
+)
+metrics_registry.gauge(
+    "yolo_batcher_queued", "Images waiting for the next micro-batch", ("model",),
+    fn=lambda: {
+        (entry.name,): entry.batcher.stats()["queued"] for entry in model_registry.resident if entry.batcher is not None
+    },
+)
+metrics_registry.gauge(
+    "yolo_video_jobs", "Background video jobs by state", ("state",),
+    fn=lambda: {(state,): job_manager.stats()[state] for state in ("running", "queued")},
+)
+metrics_registry.gauge("yolo_models_resident", "Models loaded in memory", fn=lambda: len(model_registry.resident))
 
-# Map file_id to actual filename (simple in-memory cache that survives within a process)
-# For production, use a database or persistent file index
-file_id_map: Dict[str, str] = {}
+# Startup timing breakdown (ms), filled in as the server comes up; see /ready
+startup_info: Dict = {"server_start_ms": None, "ready_ms": None, "model": None, "error": None}
+default_model_task: Optional[asyncio.Task] = None
 
-def cleanup_old_files(max_age_minutes: int = 60):
-    """Clean up files older than specified minutes"""
+async def load_default_model():
+    """Load and pin the default model so the first request doesn't pay for it"""
     try:
-        current_time = datetime.now()
-        for filename in os.listdir(RESULTS_DIR):
-            file_path = RESULTS_DIR / filename
-            if file_path.is_file():
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                age_minutes = (current_time - file_time).total_seconds() / 60
-                if age_minutes > max_age_minutes:
-                    os.remove(file_path)
-                    print(f"Cleaned up old file: {filename}")
+        entry = await model_registry.acquire()
     except Exception as e:
-        print(f"Cleanup error: {e}")
+        startup_info["error"] = str(e)
+        print(f"Startup failed: {e}")
+        return
+    model_registry.release(entry)
+    startup_info["error"] = None
+    startup_info["ready_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    startup_info["model"] = {k: v for k, v in entry.info.items() if k.endswith("_ms")}
+    print(f"Model '{entry.name}' ready: {startup_info}")
+
+@app.on_event("startup")
+async def load_model_event():
+    # The server accepts connections right away: /live answers immediately, /ready once the
+    # default model is loaded, and requests that arrive earlier wait for the load
+    global default_model_task
+    startup_info["server_start_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    default_model_task = asyncio.create_task(load_default_model())
+
+async def reap_results():
+    """Delete expired results in the background instead of scanning RESULTS_DIR per request"""
+    # Files written before the index existed, or orphaned by a crash, expire like the rest
+    adopted = await asyncio.to_thread(result_index.adopt)
+    if adopted:
+        print(f"Indexed {adopted} existing result files")
+    while True:
+        try:
+            removed = await asyncio.to_thread(result_index.reap)
+            if removed:
+                print(f"Cleaned up {removed} expired result files")
+        except Exception as e:
+            print(f"Cleanup error: {e}")
+        await asyncio.sleep(RESULT_REAP_INTERVAL)
+
+@app.on_event("startup")
+async def start_reaper_event():
+    global reaper_task
+    reaper_task = asyncio.create_task(reap_results())
+
+@app.on_event("shutdown")
+async def stop_batcher_event():
+    if reaper_task is not None:
+        reaper_task.cancel()
+    for broadcaster in webcam_broadcasters.values():
+        await broadcaster.close()
+    await model_registry.close()
+    inference_executor.shutdown()
+    job_manager.shutdown()
+
+async def acquire_model(name: Optional[str]) -> ModelEntry:
+    """The requested (or default) model, loaded if needed; release it when done"""
+    try:
+        return await model_registry.acquire(name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        # Load failed; the next request retries it
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}", headers={"Retry-After": "5"})
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request, exc: QueueFullError):
+    """Shed load quickly instead of letting requests pile up behind the model"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "queue_depth": exc.depth},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def timed_stage(path: str, stage: str, fn, *args):
+    """Call fn(*args), recording how long it took as `stage` of detection `path` (see /metrics)"""
+    with STAGE_SECONDS.time(path, stage):
+        return fn(*args)
+
+def json_response(path: str, content: Dict) -> JSONResponse:
+    """Serialize a response body here instead of in FastAPI, so it is timed as the "serialize" stage"""
+    with STAGE_SECONDS.time(path, "serialize"):
+        return JSONResponse(content)
+
+def decode_image(contents):
+    """Decode uploaded bytes (or a buffer over them) into a BGR image (None if not an image)"""
+    nparr = np.frombuffer(contents, np.uint8)
+    if nparr.size == 0:
+        return None
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+def decode_letterboxed(contents):
+    """Decode uploaded bytes straight to the model input size (a pooled Letterbox, None if not an image)"""
+    return prepare(contents, frame_pool)
+
+def lookup_or_decode(
+    contents, confidence: float, fingerprint: str, source_path: Optional[Path] = None, letterbox: bool = False
+):
+    """
+    Hash the upload and check the result cache for the model with `fingerprint`;
+    decode only on a miss (blocking). If `source_path` is given, a decodable upload
+    is also kept there as-is for deferred rendering. Returns (cache_key, cached_entry, image);
+    with `letterbox` the image is a Letterbox at the model input size (see preprocess.py).
+    """
+    key = None
+    if result_cache.enabled:
+        with STAGE_SECONDS.time("image", "cache_lookup"):
+            key = result_cache.key_for(contents, confidence, fingerprint)
+            entry = result_cache.get(key)
+        if entry is not None:
+            return key, entry, None
+    img = timed_stage("image", "decode", decode_letterboxed if letterbox else decode_image, contents)
+    if img is not None and source_path is not None:
+        with STAGE_SECONDS.time("image", "keep_source"):
+            with open(source_path, "wb") as f:
+                f.write(contents)
+    return key, None, img
+
+def save_annotated_image(result, output_path: Path, path: str = "image"):
+    """Draw bounding boxes on the image and write it to disk"""
+    annotated_img = timed_stage(path, "plot", result.plot)
+    timed_stage(path, "encode", cv2.imwrite, str(output_path), annotated_img)
 
 @app.get("/")
 async def root():
@@ -94,43 +464,127 @@ async def root():
         "name": "YOLO Object Detection API",
         "version": "1.0.0",
         "model": "final.pt",
-        "classes": model.names,
+        "models": model_registry.available,
+        "classes": model_registry.default.names if model_registry.default else None,
         "endpoints": [
             "/docs - Swagger API documentation",
             "/detect/image - Detect objects in image",
             "/detect/video - Detect objects in video",
+            "/detect/bulk - Detect objects in many images or a zip/tar archive (NDJSON stream)",
+            "/jobs/video - Submit a background video detection job",
+            "/jobs/{job_id} - Job status (GET) or cancel (DELETE)",
+            "/jobs/{job_id}/events - Job progress stream (Server-Sent Events)",
             "/download/{file_id} - Download detected file",
             "/detect/webcam - Live webcam detection (WebSocket)",
+            "/ws/detect - Detection on frames pushed by the client (WebSocket)",
             "/health - Health check",
+            "/metrics - Prometheus metrics (per-stage latency, throughput, queue depth)",
+            "/live - Liveness probe",
+            "/ready - Readiness probe (503 until the default model is loaded)",
         ]
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    default = model_registry.default
     return {
-        "status": "healthy",
-        "model_loaded": True,
+        "status": "healthy" if default is not None else "starting",
+        "model_loaded": default is not None,
         "model_path": str(MODEL_PATH),
-        "classes": len(model.names),
+        "classes": len(default.names) if default is not None else None,
+        "batching": default.batcher.stats() if default is not None else None,
+        "startup": startup_info,
+        "models": model_registry.stats(),
+        "inference_queue": inference_executor.stats(),
+        "video_jobs": job_manager.stats(),
+        "result_cache": result_cache.stats(),
+        "results": await asyncio.to_thread(result_index.stats),
+        "frame_pool": frame_pool.stats(),
+        "live_streams": {f"{source}/{name}": b.stats() for (source, name), b in webcam_broadcasters.items()},
+        "model_workers": default.model.stats() if default is not None and isinstance(default.model, SharedMemoryModelPool) else None,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms for each detection path
+    (yolo_stage_seconds), model call stages and batch sizes, per-endpoint request
+    counts and latency, in-flight requests, queue depths and dropped frames.
+    """
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/live")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the default model is loaded and warmed up, 503 with
+    Retry-After before that. A failed load is retried on the next probe.
+    Includes the startup timing breakdown.
+    """
+    global default_model_task
+    if model_registry.default is None:
+        if default_model_task is not None and default_model_task.done():
+            default_model_task = asyncio.create_task(load_default_model())
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "loading": model_registry.is_loading(), "startup": startup_info},
+            headers={"Retry-After": "1"},
+        )
+    return {"ready": True, "startup": startup_info}
+
+@app.get("/load")
+async def load_status():
+    """
+    Inference queue depth and wait times for load balancer routing.
+    Returns 503 while the queue is saturated so the node can be taken out of rotation.
+    """
+    stats = inference_executor.stats()
+    if stats["saturated"]:
+        return JSONResponse(
+            status_code=503,
+            content=stats,
+            headers={"Retry-After": str(inference_executor.retry_after())},
+        )
+    return stats
+
 @app.get("/model-info")
-async def model_info():
-    """Get model information"""
-    return {
-        "model_name": "final.pt",
-        "model_path": str(MODEL_PATH),
-        "classes": model.names,
-        "num_classes": len(model.names),
-        "confidence_threshold": CONFIDENCE_THRESHOLD
-    }
+async def model_info(model_name: Optional[str] = Query(None, alias="model")):
+    """
+    Get model information for ?model= (default model if omitted), loading it if
+    needed, plus the registry: available and resident models and their memory use
+    """
+    entry = await acquire_model(model_name)
+    try:
+        return {
+            "model_name": entry.path.name,
+            "model_path": str(entry.path),
+            "classes": entry.names,
+            "num_classes": len(entry.names),
+            "confidence_threshold": CONFIDENCE_THRESHOLD,
+            "engine": {"engine": entry.engine, "artifact": entry.info.get("artifact"), "warmup_ms": entry.info.get("warmup_ms")},
+            "models": model_registry.stats()
+        }
+    finally:
+        model_registry.release(entry)
 
 @app.post("/detect/image")
 async def detect_image(
     file: UploadFile = File(...),
-    confidence: float = CONFIDENCE_THRESHOLD
+    confidence: float = CONFIDENCE_THRESHOLD,
+    response_format: str = Query(detection_formats.FORMAT_OBJECTS, alias="format"),
+    annotate: Optional[bool] = None,
+    model_name: Optional[str] = Query(None, alias="model"),
+    sliced: bool = False,
+    tile_size: int = Query(SLICE_TILE_SIZE, ge=64, le=4096),
+    tile_overlap: float = Query(SLICE_OVERLAP, ge=0.0, lt=1.0),
+    tile_batch: int = Query(SLICE_BATCH_SIZE, ge=1, le=64),
+    merge: str = Query(MERGE_NMS)
 ):
     """
     Detect objects in an uploaded image.
@@ -138,125 +592,429 @@ async def detect_image(
     Parameters:
     - file: Image file (jpg, png, etc.)
     - confidence: Detection confidence threshold (0.0-1.0)
+    - format: "objects" (one JSON object per detection, default) or "columnar"
+      (parallel class_ids/scores arrays, a flat boxes array and class names sent once)
+    - annotate: Draw the annotated image now (true) or only when it is first
+      downloaded (false); defaults to the server's ANNOTATE_DEFAULT
+    - model: Registered model to use (see /model-info); defaults to the server's default model
+    - sliced: Run the model over overlapping tiles instead of the downscaled image, so
+      small objects in high-resolution images survive (see slicing.py)
+    - tile_size, tile_overlap, tile_batch: Tile edge in px, fraction shared by neighbouring
+      tiles and tiles per forward pass (sliced mode only)
+    - merge: How boxes found in several tiles are combined: "nms" keeps the best one,
+      "fuse" merges them into their enclosing box (sliced mode only)
     
     Returns:
     - JSON with detections and download URL
     """
+    if response_format not in detection_formats.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(detection_formats.FORMATS)}")
+    if merge not in MERGE_METHODS:
+        raise HTTPException(status_code=400, detail=f"merge must be one of {list(MERGE_METHODS)}")
+    
+    def format_detections(columnar: Dict):
+        if response_format == detection_formats.FORMAT_COLUMNAR:
+            return columnar
+        return detection_formats.columnar_to_objects(columnar)
+    
+    if annotate is None:
+        annotate = ANNOTATE_DEFAULT
+    
+    entry = await acquire_model(model_name)
+    # Nothing is drawn on or cut out of the full-size image, so decode it at the model input size
+    fast_decode = FAST_DECODE and not annotate and not sliced
+    # Sliced results depend on the tiling and fast-decoded ones on the reduced decode,
+    # so each is cached separately
+    fingerprint = entry.fingerprint
+    if sliced:
+        fingerprint += f"|slice={tile_size},{tile_overlap},{merge},{SLICE_MERGE_THRESHOLD},{SLICE_FULL_IMAGE}"
+    if fast_decode:
+        fingerprint += "|fast"
+    letterbox = None
     try:
-        # Clean up old files first
-        cleanup_old_files(30)  # Clean files older than 30 minutes
+        file_id = str(uuid.uuid4())
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Use original file extension, default to jpg if not available
+        original_ext = Path(file.filename).suffix.lower() if file.filename else ".jpg"
+        if original_ext not in [".jpg", ".jpeg", ".png"]:
+            original_ext = ".jpg"
+        # Detections-only requests keep the untouched upload for rendering later
+        source_name = None if annotate else source_filename(timestamp, file_id, original_ext)
         
-        # Read uploaded file
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Stream the upload into a memory-mapped spool file instead of reading it into RAM
+        with STAGE_SECONDS.time("image", "upload"):
+            upload = await map_upload(file, MAX_IMAGE_UPLOAD_BYTES, spool_dir=UPLOAD_SPOOL_DIR)
+        try:
+            cache_key, cached, img = await inference_executor.run(
+                lookup_or_decode,
+                upload.array(),
+                confidence,
+                fingerprint,
+                RESULTS_DIR / source_name if source_name else None,
+                fast_decode,
+            )
+        finally:
+            upload.close()
+        if fast_decode and img is not None:
+            letterbox, img = img, img.image
+        
+        # Same bytes, threshold and model seen before: reuse detections and annotated file
+        if cached is not None:
+            # Keep the files the cached entry points to around for another TTL
+            await asyncio.to_thread(result_index.touch, cached["file_id"])
+            IMAGES_TOTAL.inc(1, "image", "true")
+            return json_response("image", {
+                "status": "success",
+                "detections": format_detections(cached["columnar"]),
+                "num_detections": cached["columnar"]["count"],
+                "download_url": f"/download/{cached['file_id']}",
+                "file_id": cached["file_id"],
+                "timestamp": cached["timestamp"],
+                "model": entry.name,
+                "cached": True,
+                "message": "Use the download_url to download the annotated image"
+            })
         
         if img is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        # Run detection
-        results = model(img, conf=confidence)
-        result = results[0]
-        
-        # Extract detections
-        detections = []
-        for box in result.boxes:
-            detection = {
-                "class_id": int(box.cls[0]),
-                "class_name": model.names[int(box.cls[0])],
-                "confidence": float(box.conf[0]),
-                "bbox": {
-                    "x1": float(box.xyxy[0][0]),
-                    "y1": float(box.xyxy[0][1]),
-                    "x2": float(box.xyxy[0][2]),
-                    "y2": float(box.xyxy[0][3]),
-                }
-            }
-            detections.append(detection)
+        slicing_stats = None
+        model_started = time.perf_counter()
+        if sliced:
+            # Tiles go straight to the model in batches of their own
+            rows, slicing_stats = await inference_executor.run(
+                detect_sliced,
+                img,
+                entry.predict_batch,
+                confidence,
+                tile_size,
+                tile_overlap,
+                tile_batch,
+                merge,
+                SLICE_MERGE_THRESHOLD,
+                SLICE_FULL_IMAGE,
+            )
+            result = detection_formats.to_results(img, rows, entry.names)
+        else:
+            # Run detection (coalesced with concurrent requests into one batch)
+            result = await entry.batcher.submit(img, confidence)
+        # Includes waiting for the micro-batch; per-call model stages are in yolo_model_seconds
+        STAGE_SECONDS.observe(time.perf_counter() - model_started, "image", "model")
         
-        # Draw bounding boxes on image
-        annotated_img = result.plot()
+        # Extract detections in bulk
+        with STAGE_SECONDS.time("image", "extract"):
+            arrays = detection_formats.extract(result)
+            if letterbox is not None:
+                # Back to original image coordinates; the buffer is free for the next upload
+                arrays = letterbox.to_original(arrays)
+                letterbox.release()
+            columnar = detection_formats.to_columnar(arrays, entry.names)
         
-        # Save annotated image with unique ID
-        file_id = str(uuid.uuid4())
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Use original file extension, default to jpg if not available
-        original_ext = Path(file.filename).suffix.lower() if file.filename else ".jpg"
-        if original_ext not in [".jpg", ".jpeg", ".png"]:
-            original_ext = ".jpg"
-        output_filename = f"detection_{timestamp}_{file_id}{original_ext}"
-        output_path = RESULTS_DIR / output_filename
+        if annotate:
+            # Save annotated image with unique ID
+            output_filename = f"detection_{timestamp}_{file_id}{original_ext}"
+            output_path = RESULTS_DIR / output_filename
+            
+            # Draw bounding boxes and write to disk off the event loop
+            await inference_executor.run(save_annotated_image, result, output_path)
+        else:
+            # Only a compact detection record; /download renders the image on demand
+            output_filename = record_filename(timestamp, file_id)
+            await inference_executor.run(
+                timed_stage,
+                "image",
+                "record",
+                save_record,
+                RESULTS_DIR / output_filename,
+                detection_formats.to_rows(arrays),
+                source_name,
+                entry.names,
+            )
         
-        cv2.imwrite(str(output_path), annotated_img)
+        # Index what was written so /download finds it and the reaper expires it
+        if annotate:
+            indexed = [(output_filename, file_id, KIND_IMAGE)]
+        else:
+            indexed = [(output_filename, file_id, KIND_RECORD), (source_name, file_id, KIND_SOURCE)]
         
-        # Store mapping (for quick lookup)
-        file_id_map[file_id] = output_filename
+        if cache_key is not None:
+            result_cache.put(cache_key, {
+                "file_id": file_id,
+                "output_filename": output_filename,
+                "timestamp": timestamp,
+                "columnar": columnar,
+            })
+            if result_cache.disk:
+                indexed.append((result_cache.disk_path(cache_key).name, file_id, KIND_CACHE))
+        # One SQLite transaction, off the event loop (it may wait on another process's write lock)
+        await asyncio.to_thread(result_index.add_many, indexed)
         
         # Generate download URL
         download_url = f"/download/{file_id}"
         
-        return {
+        IMAGES_TOTAL.inc(1, "image", "false")
+        return json_response("image", {
             "status": "success",
-            "detections": detections,
-            "num_detections": len(detections),
+            "detections": format_detections(columnar),
+            "num_detections": columnar["count"],
             "download_url": download_url,
             "file_id": file_id,
             "timestamp": timestamp,
+            "model": entry.name,
+            "cached": False,
+            **({"slicing": slicing_stats} if slicing_stats else {}),
             "message": "Use the download_url to download the annotated image"
-        }
+        })
     
+    except (HTTPException, QueueFullError):
+        raise
+    except asyncio.CancelledError:
+        # A batch may still be reading the buffer; leave it to the garbage collector
+        letterbox = None
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if letterbox is not None:
+            letterbox.release()
+        model_registry.release(entry)
+
+async def detect_bulk_item(
+    entry: ModelEntry,
+    index: int,
+    item: BulkItem,
+    confidence: float,
+    response_format: str,
+    annotate: bool,
+) -> Dict:
+    """Detect on one bulk image and build its NDJSON record"""
+    line = {"type": "image", "index": index, "name": item.name}
+    if item.error:
+        return {**line, "type": "error", "error": item.error}
+    fast_decode = FAST_DECODE and not annotate
+    letterbox = None
+    while True:
+        try:
+            if fast_decode:
+                letterbox = await inference_executor.run(timed_stage, "bulk", "decode", decode_letterboxed, item.data)
+                img = letterbox.image if letterbox is not None else None
+            else:
+                img = await inference_executor.run(timed_stage, "bulk", "decode", decode_image, item.data)
+            if img is None:
+                return {**line, "type": "error", "error": "Invalid image file"}
+            with STAGE_SECONDS.time("bulk", "model"):
+                result = await entry.batcher.submit(img, confidence)
+            break
+        except QueueFullError as e:
+            # Bulk work yields to interactive traffic instead of failing
+            await asyncio.sleep(e.retry_after)
+        except asyncio.CancelledError:
+            # A batch may still be reading the buffer; leave it to the garbage collector
+            letterbox = None
+            raise
+        finally:
+            # Whatever happened, the model is done with the buffer (a retry decodes again)
+            if letterbox is not None:
+                letterbox.release()
+    
+    with STAGE_SECONDS.time("bulk", "extract"):
+        arrays = detection_formats.extract(result)
+        if letterbox is not None:
+            arrays = letterbox.to_original(arrays)
+        columnar = detection_formats.to_columnar(arrays, entry.names)
+    IMAGES_TOTAL.inc(1, "bulk", "false")
+    line["num_detections"] = columnar["count"]
+    if response_format == detection_formats.FORMAT_COLUMNAR:
+        line["detections"] = columnar
+    else:
+        line["detections"] = detection_formats.columnar_to_objects(columnar)
+    
+    if annotate:
+        file_id = str(uuid.uuid4())
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"detection_{timestamp}_{file_id}.jpg"
+        await inference_executor.run(save_annotated_image, result, RESULTS_DIR / output_filename, "bulk")
+        await asyncio.to_thread(result_index.add, output_filename, file_id, KIND_IMAGE)
+        line["file_id"] = file_id
+        line["download_url"] = f"/download/{file_id}"
+    return line
 
-@app.get("/download/{file_id}")
-async def download_file(file_id: str):
+async def stream_bulk_results(
+    spooled: List,
+    model_name: Optional[str],
+    confidence: float,
+    response_format: str,
+    annotate: bool,
+):
     """
-    Download detected image file.
-    File is looked up by UUID; if found, it's served immediately.
+    NDJSON lines for every image in the spooled uploads, in completion order, then a summary.
+    At most BULK_MAX_IN_FLIGHT images are read and in progress at any time.
     """
+    started = time.perf_counter()
+    counts = {"images": 0, "failed": 0, "detections": 0}
+    entry = None
+    pending = set()
     try:
-        # Check if file_id is in the map (quick lookup)
-        if file_id in file_id_map:
-            output_filename = file_id_map[file_id]
-            file_path = RESULTS_DIR / output_filename
-        else:
-            # Fallback: try to find file by UUID in results directory
-            # (handles cases where the map wasn't populated)
-            matching_files = list(RESULTS_DIR.glob(f"*_{file_id}.jpg"))
-            if not matching_files:
-                matching_files = list(RESULTS_DIR.glob(f"*_{file_id}.jpeg"))
-            if not matching_files:
-                matching_files = list(RESULTS_DIR.glob(f"*_{file_id}.png"))
-            if not matching_files:
-                matching_files = list(RESULTS_DIR.glob(f"*_{file_id}.mp4"))
-            
-            if not matching_files:
-                raise HTTPException(status_code=404, detail="File not found")
-            
-            file_path = matching_files[0]
+        try:
+            entry = await model_registry.acquire(model_name)
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": f"Model unavailable: {e}"}) + "\n"
+            return
         
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found on server")
+        items = iter_images(spooled, MAX_IMAGE_UPLOAD_BYTES)
+        index = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < BULK_MAX_IN_FLIGHT:
+                try:
+                    item = await asyncio.to_thread(next, items, None)
+                except Exception as e:
+                    # iter_images reports bad archives itself; this is a last resort so the
+                    # images already in flight and the summary still go out
+                    item = BulkItem("", None, f"Reading uploads failed: {e}")
+                    exhausted = True
+                if item is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(
+                    detect_bulk_item(entry, index, item, confidence, response_format, annotate)
+                ))
+                index += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    line = task.result()
+                except Exception as e:
+                    line = {"type": "error", "error": str(e)}
+                counts["images"] += 1
+                if line["type"] == "error":
+                    counts["failed"] += 1
+                else:
+                    counts["detections"] += line["num_detections"]
+                with STAGE_SECONDS.time("bulk", "serialize"):
+                    text = json.dumps(line) + "\n"
+                yield text
         
-        # Determine media type based on file extension
-        suffix = file_path.suffix.lower()
-        if suffix == ".jpg" or suffix == ".jpeg":
-            media_type = "image/jpeg"
-        elif suffix == ".png":
-            media_type = "image/png"
-        elif suffix == ".mp4":
-            media_type = "video/mp4"
-        else:
-            media_type = "application/octet-stream"
+        elapsed = time.perf_counter() - started
+        yield json.dumps({
+            "type": "summary",
+            **counts,
+            "model": entry.name,
+            "elapsed_s": round(elapsed, 3),
+            "images_per_s": round(counts["images"] / elapsed, 2) if elapsed > 0 else None,
+        }) + "\n"
+    finally:
+        # Also runs when the client goes away mid-stream
+        for task in pending:
+            task.cancel()
+        for _, fh in spooled:
+            fh.close()
+        if entry is not None:
+            model_registry.release(entry)
+
+@app.post("/detect/bulk")
+async def detect_bulk(
+    files: List[UploadFile] = File(...),
+    confidence: float = CONFIDENCE_THRESHOLD,
+    response_format: str = Query(detection_formats.FORMAT_OBJECTS, alias="format"),
+    annotate: bool = False,
+    model_name: Optional[str] = Query(None, alias="model")
+):
+    """
+    Detect objects in many images in one request.
+    
+    Upload any number of images and/or zip or tar(.gz/.bz2/.xz) archives of images
+    as "files" (for thousands of images, use an archive: multipart requests are
+    limited to 1000 files). Images are read one at a time, run through the batched
+    model and answered as application/x-ndjson, one line per image as soon as it is
+    done (so lines arrive in completion order; "index" is the input order):
+    
+    - {"type": "image", "index", "name", "num_detections", "detections"[, "file_id", "download_url"]}
+    - {"type": "error", "index", "name", "error"} for unreadable entries
+    - {"type": "summary", "images", "failed", "detections", "model", "elapsed_s", "images_per_s"} last
+    
+    annotate=true also writes an annotated image per input (default false: detections only).
+    """
+    if response_format not in detection_formats.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(detection_formats.FORMATS)}")
+    if model_name and model_name not in model_registry.available:
+        raise HTTPException(status_code=404, detail=str(UnknownModelError(model_name, model_registry.available)))
+    
+    # The form's files are closed when this function returns, before the stream runs
+    spooled = []
+    try:
+        for file in files:
+            fh, _ = await spool_temp(file, MAX_BULK_UPLOAD_BYTES, spool_dir=UPLOAD_SPOOL_DIR)
+            spooled.append((file.filename or "upload", fh))
+    except BaseException:
+        for _, fh in spooled:
+            fh.close()
+        raise
+    
+    return StreamingResponse(
+        stream_bulk_results(spooled, model_name, confidence, response_format, annotate),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+# One render at a time per file_id, so concurrent first downloads don't all draw the image
+render_locks: Dict[str, asyncio.Lock] = {}
+
+async def render_on_demand(file_id: str, record_path: Path) -> Path:
+    """Draw the annotated image for a detections-only result and remember where it went"""
+    lock = render_locks.setdefault(file_id, asyncio.Lock())
+    try:
+        async with lock:
+            # Records carry their model's class names. Older ones use the default model's if it
+            # is loaded; a download never waits for (or fails on) a model load
+            default = model_registry.get()
+            output_path = await inference_executor.run(
+                render_record, record_path, default.names if default is not None else None
+            )
+    finally:
+        if not lock.locked():
+            render_locks.pop(file_id, None)
+    if output_path is None:
+        raise HTTPException(status_code=404, detail="Source image no longer available")
+    # From now on /download serves the rendered image directly
+    await asyncio.to_thread(result_index.add, output_path.name, file_id, KIND_IMAGE)
+    return output_path
+
+@app.api_route("/download/{file_id}", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request):
+    """
+    Download detected image file.
+    File is looked up by UUID in the result index; if found, it's served immediately.
+    Supports Range (206) and If-None-Match / If-Modified-Since (304), see delivery.py.
+    """
+    try:
+        output_filename = await asyncio.to_thread(result_index.lookup, file_id)
+        if output_filename is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        file_path = RESULTS_DIR / output_filename
+        
+        if is_record(file_path):
+            if not file_path.exists():
+                await asyncio.to_thread(result_index.forget, output_filename)
+                raise HTTPException(status_code=404, detail="File not found on server")
+            file_path = await render_on_demand(file_id, file_path)
         
         # Return the file as response (client downloads it)
-        return FileResponse(
-            path=file_path,
-            media_type=media_type,
-            filename=f"detected_{file_id}{suffix}"
-        )
+        try:
+            return serve_file(
+                request.headers,
+                file_path,
+                filename=f"detected_{file_id}{file_path.suffix.lower()}",
+                cache_seconds=RESULT_TTL_MINUTES * 60,
+                accel_prefix=DOWNLOAD_ACCEL_PREFIX,
+            )
+        except FileNotFoundError:
+            await asyncio.to_thread(result_index.forget, file_path.name)
+            raise HTTPException(status_code=404, detail="File not found on server")
         
-    except HTTPException:
+    except (HTTPException, QueueFullError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Download error: {str(e)}")
@@ -307,80 +1065,68 @@ async def download_file(file_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Download error: {str(e)}")
 
+def observe_video_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, "video", stage)
+
+def check_video_mode(mode: str):
+    if mode not in VIDEO_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(VIDEO_MODES)}")
+
 @app.post("/detect/video")
 async def detect_video(
     file: UploadFile = File(...),
-    confidence: float = CONFIDENCE_THRESHOLD
+    confidence: float = CONFIDENCE_THRESHOLD,
+    mode: str = Query(MODE_SKIP, description="skip: every 3rd frame at 1/3 fps; track: full frame rate with tracked boxes"),
+    motion_threshold: float = Query(MOTION_THRESHOLD, ge=0.0, le=1.0, description="Reuse detections while the scene changes less than this (0 = off)"),
+    model_name: Optional[str] = Query(None, alias="model", description="Registered model to use (default model if omitted)")
 ):
-    """Detect objects in uploaded video"""
+    """
+    Detect objects in uploaded video.
+    The model runs on every 3rd frame. mode=skip writes only those frames (at a third
+    of the frame rate); mode=track writes every frame, tracking boxes between them,
+    and labels each box with a track id.
+    With motion_threshold, frames that barely differ from the last inferred one reuse
+    its detections instead of running the model; the response reports how many were skipped.
+    """
+    check_video_mode(mode)
+    entry = await acquire_model(model_name)
     try:
-        # Clean up old files first
-        cleanup_old_files(30)
-        
         file_id = str(uuid.uuid4())
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         temp_video = RESULTS_DIR / f"temp_{timestamp}_{file_id}.mp4"
 
-        contents = await file.read()
-        with open(temp_video, "wb") as f:
-            f.write(contents)
-
-        cap = cv2.VideoCapture(str(temp_video))
-        if not cap.isOpened():
-            raise HTTPException(status_code=400, detail="Invalid video file")
-
-        # Original FPS and resolution
-        orig_fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # Reduce frame rate for faster processing
-        skip_rate = 3
-        fps = orig_fps / skip_rate
+        # Stream the upload to disk in chunks rather than buffering it in memory
+        with STAGE_SECONDS.time("video", "upload"):
+            await spool_upload(file, temp_video, MAX_VIDEO_UPLOAD_BYTES)
 
         output_filename = f"detected_{timestamp}_{file_id}.mp4"
         output_path = RESULTS_DIR / output_filename
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-
-        frame_count = 0
-        processed_frames = 0
-        detections_list = []
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame_count += 1
-
-            # Skip frames for lower FPS
-            if frame_count % skip_rate != 0:
-                continue
-
-            results = model(frame, conf=confidence)
-            result = results[0]
-
-            for box in result.boxes:
-                detections_list.append({
-                    "frame": processed_frames,
-                    "class": model.names[int(box.cls[0])],
-                    "confidence": float(box.conf[0])
-                })
-
-            annotated_frame = result.plot()
-            out.write(annotated_frame)
-            processed_frames += 1
 
-        cap.release()
-        out.release()
-        
-        # Clean up temp file
-        if temp_video.exists():
-            os.remove(temp_video)
+        try:
+            # Decode, batched inference and encode run as a pipeline on the inference pool
+            stats = await inference_executor.run(
+                lambda: process_video(
+                    temp_video,
+                    output_path,
+                    entry.predict_batch,
+                    confidence,
+                    batch_size=VIDEO_BATCH_SIZE,
+                    queue_size=VIDEO_QUEUE_SIZE,
+                    mode=mode,
+                    motion_threshold=motion_threshold,
+                    observe=observe_video_stage,
+                )
+            )
+            FRAMES_TOTAL.inc(stats["frames_processed"], "video")
+        except InvalidVideoError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            # Clean up temp file
+            if temp_video.exists():
+                os.remove(temp_video)
 
-        # Store file mapping
-        file_id_map[file_id] = output_filename
+        # Index the video so /download finds it and the reaper expires it
+        await asyncio.to_thread(result_index.add, output_filename, file_id, KIND_VIDEO)
 
         # Generate download URL
         download_url = f"/download/{file_id}"
@@ -389,78 +1135,567 @@ async def detect_video(
             "status": "success",
             "download_url": download_url,
             "file_id": file_id,
-            "frames_processed": processed_frames,
-            "total_frames": frame_count,
-            "original_fps": orig_fps,
-            "processed_fps": fps,
+            **stats,
+            "model": entry.name,
             "timestamp": timestamp,
             "message": "Use the download_url to download the annotated video"
         }
 
+    except (HTTPException, QueueFullError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        model_registry.release(entry)
+
+@app.post("/jobs/video", status_code=202)
+async def submit_video_job(
+    file: UploadFile = File(...),
+    confidence: float = CONFIDENCE_THRESHOLD,
+    mode: str = Query(MODE_SKIP, description="skip or track, as for /detect/video"),
+    motion_threshold: float = Query(MOTION_THRESHOLD, ge=0.0, le=1.0, description="As for /detect/video"),
+    model_name: Optional[str] = Query(None, alias="model", description="As for /detect/video")
+):
+    """
+    Queue video detection as a background job and return its id immediately.
+    Poll /jobs/{job_id} or stream /jobs/{job_id}/events for progress; the result
+    carries the same fields as /detect/video once the job completes.
+    """
+    check_video_mode(mode)
+
+    file_id = str(uuid.uuid4())
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    temp_video = RESULTS_DIR / f"temp_{timestamp}_{file_id}.mp4"
+    output_filename = f"detected_{timestamp}_{file_id}.mp4"
+    output_path = RESULTS_DIR / output_filename
+
+    with STAGE_SECONDS.time("video", "upload"):
+        await spool_upload(file, temp_video, MAX_VIDEO_UPLOAD_BYTES)
+
+    # Held until the job finishes so the model isn't evicted under it
+    try:
+        entry = await acquire_model(model_name)
+    except Exception:
+        os.remove(temp_video)
+        raise
+
+    def work(job: Job) -> Dict:
+        stats = process_video(
+            temp_video,
+            output_path,
+            entry.predict_batch,
+            confidence,
+            batch_size=VIDEO_BATCH_SIZE,
+            queue_size=VIDEO_QUEUE_SIZE,
+            progress=job.update_progress,
+            cancel=job.cancel_event,
+            mode=mode,
+            motion_threshold=motion_threshold,
+            observe=observe_video_stage,
+        )
+        FRAMES_TOTAL.inc(stats["frames_processed"], "video")
+        # Indexed here, on the job's thread, rather than in finish() on the event loop
+        result_index.add(output_filename, file_id, KIND_VIDEO)
+        return {
+            "download_url": f"/download/{file_id}",
+            "file_id": file_id,
+            **stats,
+            "model": entry.name,
+            "timestamp": timestamp,
+        }
+
+    def finish(job: Job):
+        model_registry.release(entry)
+        if temp_video.exists():
+            os.remove(temp_video)
+        if job.status != COMPLETED and output_path.exists():
+            # Failed or cancelled: don't leave a truncated video behind
+            os.remove(output_path)
+
+    try:
+        job = job_manager.submit("video", work, on_finish=finish)
+    except QueueFullError:
+        model_registry.release(entry)
+        os.remove(temp_video)
+        raise
+
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "message": "Poll status_url or stream events_url for progress"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status, progress (frames, fps, ETA) and result of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of job progress; ends with a 'done' event"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_manager.events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def read_webcam_frame(
+    cap,
+    entry: ModelEntry,
+    imgsz: int = 640,
+    jpeg_quality: int = 70,
+    gate: Optional[MotionGate] = None,
+    buffer: Optional[np.ndarray] = None,
+):
+    """
+    Grab one webcam frame, run detection with `entry` and JPEG-encode the annotated result (blocking).
+    Returns (detection_arrays, jpeg_bytes, stage_timings), or None when the capture has ended.
+    `imgsz` is the inference size (ignored by the model worker pool). With a motion
+    gate, detection is skipped and the previous detections reused while the scene is unchanged.
+    Frames are scaled to EXPORT_IMGSZ on their longest side, into `buffer` if given (see preprocess.py).
+    """
+    t0 = time.perf_counter()
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    
+    # One resize to the model input size, aspect ratio kept, so the model's letterbox only pads
+    # (at the default imgsz); boxes and the streamed frame share these coordinates
+    if buffer is None:
+        buffer = np.empty((EXPORT_IMGSZ, EXPORT_IMGSZ, 3), np.uint8)
+    frame = letterbox_into(frame, buffer, EXPORT_IMGSZ)
+    t1 = time.perf_counter()
+    
+    # Run detection
+    if gate is None or gate.check(frame) or gate.last is None:
+        results = entry.run(frame, conf=CONFIDENCE_THRESHOLD, imgsz=imgsz)
+        result = results[0]
+        if gate is not None:
+            gate.last = result
+    else:
+        result = detection_formats.carry_over(gate.last, frame)
+    t_model = time.perf_counter()
+    
+    # Extract detections in bulk
+    arrays = detection_formats.extract(result)
+    t2 = time.perf_counter()
+    
+    # Draw annotations
+    annotated_frame = result.plot()
+    t_plot = time.perf_counter()
+    
+    # Encode frame to JPEG
+    _, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    t3 = time.perf_counter()
+    for stage, seconds in (
+        ("capture", t1 - t0), ("model", t_model - t1), ("extract", t2 - t_model),
+        ("plot", t_plot - t2), ("encode", t3 - t_plot),
+    ):
+        STAGE_SECONDS.observe(seconds, "webcam", stage)
+    return arrays, buffer.tobytes(), {"capture": t1 - t0, "inference": t2 - t1, "encode": t3 - t2}
+
+def negotiate_stream_protocol(websocket: WebSocket):
+    """Pick the binary frame protocol if the client offered it, else the legacy text protocol"""
+    if BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return BINARY_SUBPROTOCOL
+    return None
+
+async def send_stream_hello(websocket: WebSocket, subprotocol, names: Dict[int, str]):
+    """Binary clients get the class names once up front instead of in every frame"""
+    if subprotocol == BINARY_SUBPROTOCOL:
+        await websocket.send_json({
+            "type": "hello",
+            "protocol": BINARY_SUBPROTOCOL,
+            "class_names": {str(k): v for k, v in names.items()},
+        })
+
+async def send_detection_frame(
+    websocket: WebSocket,
+    subprotocol,
+    response_format: str,
+    seq: int,
+    arrays,
+    frame_data: Optional[bytes],
+    names: Dict[int, str],
+    extra: Optional[Dict] = None
+):
+    """
+    Send one annotated frame plus its detections (labelled with `names`) in the negotiated protocol.
+    With frame_data=None only the detections are sent; `extra` fields are added
+    to text-mode detection messages.
+    """
+    if subprotocol == BINARY_SUBPROTOCOL:
+        # One binary message: header, packed detections, raw JPEG
+        await websocket.send_bytes(encode_frame(seq, time.time(), arrays, frame_data or b""))
+        return
+    
+    # Send frame and detections
+    if response_format == detection_formats.FORMAT_COLUMNAR:
+        await websocket.send_json({
+            "type": "detections",
+            **detection_formats.to_columnar(arrays, names),
+            **(extra or {}),
+            "timestamp": datetime.now().isoformat()
+        })
+    else:
+        detections = detection_formats.to_stream_objects(arrays, names)
+        await websocket.send_json({
+            "type": "detections",
+            "count": len(detections),
+            "objects": detections,
+            **(extra or {}),
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    if frame_data is not None:
+        # Send image as base64
+        await websocket.send_text(f"data:image/jpeg;base64,{base64.b64encode(frame_data).decode()}")
+
+async def capture_webcam(source: int, model_name: str, publish, report):
+    """
+    Live producer for one camera and model: capture, detect and encode frames until
+    cancelled, publishing (seq, detection_arrays, jpeg_bytes) for the viewers.
+    """
+    entry = await model_registry.acquire(model_name)
+    try:
+        await stream_webcam(source, entry, publish, report)
+    finally:
+        model_registry.release(entry)
+
+async def stream_webcam(source: int, entry: ModelEntry, publish, report):
+    cap = await asyncio.to_thread(cv2.VideoCapture, source)
+    if not cap.isOpened():
+        cap.release()
+        raise RuntimeError("Cannot open webcam")
+    
+    # A read may still be running on the executor when the producer is cancelled;
+    # the lock keeps release() from pulling the capture out from under it
+    capture_lock = threading.Lock()
+    
+    gate = MotionGate(WEBCAM_MOTION_THRESHOLD)
+    # Every frame is resized into the same buffer
+    buffer = frame_pool.acquire()
+    
+    def read_frame(imgsz: int, jpeg_quality: int):
+        with capture_lock:
+            return read_webcam_frame(cap, entry, imgsz, jpeg_quality, gate, buffer)
+    
+    def release():
+        with capture_lock:
+            cap.release()
+            frame_pool.release(buffer)
+    
+    pacer = AdaptivePacer(target_fps=WEBCAM_TARGET_FPS, latency_budget_ms=WEBCAM_LATENCY_BUDGET_MS)
+    try:
+        seq = 0
+        while True:
+            pacer.start_frame()
+            try:
+                frame_result = await inference_executor.run(read_frame, pacer.imgsz, pacer.jpeg_quality)
+            except QueueFullError as e:
+                # Node is overloaded: drop this frame rather than queue behind uploads
+                pacer.overloaded()
+                FRAMES_DROPPED.inc(1, "webcam", "overloaded")
+                report({**pacer.stats(), **gate.stats()})
+                await asyncio.sleep(min(e.retry_after, 1))
+                continue
+            if frame_result is None:
+                break
+            arrays, frame_data, timings = frame_result
+            
+            publish_start = time.perf_counter()
+            skipped = publish((seq, arrays, frame_data))
+            timings["send"] = time.perf_counter() - publish_start
+            STAGE_SECONDS.observe(timings["send"], "webcam", "send")
+            FRAMES_TOTAL.inc(1, "webcam")
+            if skipped:
+                FRAMES_DROPPED.inc(skipped, "webcam", "slow_viewer")
+            seq += 1
+            
+            delay = pacer.end_frame(timings)
+            report({**pacer.stats(), **gate.stats()})
+            await asyncio.sleep(delay)
+    finally:
+        await asyncio.to_thread(release)
+
+def get_webcam_broadcaster(source: int, model_name: str) -> FrameBroadcaster:
+    """The shared producer for a camera and model, created on first use"""
+    broadcaster = webcam_broadcasters.get((source, model_name))
+    if broadcaster is None:
+        broadcaster = FrameBroadcaster(
+            lambda publish, report: capture_webcam(source, model_name, publish, report),
+            queue_size=WEBCAM_VIEWER_QUEUE,
+        )
+        webcam_broadcasters[(source, model_name)] = broadcaster
+    return broadcaster
+
+async def wait_for_disconnect(websocket: WebSocket):
+    """Return once the client has closed the connection (other incoming messages are ignored)"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
 
 @app.websocket("/ws/webcam")
 async def websocket_webcam(websocket: WebSocket):
     """
     WebSocket endpoint for live webcam detection.
     Connect and receive real-time detection frames as JPEG images.
+    Add ?format=columnar to receive detections as parallel arrays instead of objects.
+    Offer the "yolo.binary.v1" subprotocol to get one binary message per frame
+    (see stream_protocol.py) instead of a JSON message plus a base64 image.
+    
+    One capture-and-detect producer runs per camera (?source=, default 0) and model
+    (?model=, default model if omitted) and is shared by all viewers of that pair:
+    every frame is captured, detected and encoded once,
+    then fanned out. Each viewer has a small queue and skips frames when it falls
+    behind instead of slowing down the others; ?fps= caps the rate for one viewer.
+    
+    The producer paces itself to the measured frame time (see pacing.py), targeting
+    WEBCAM_TARGET_FPS / WEBCAM_LATENCY_BUDGET_MS: inference size and JPEG quality step
+    down when the budget is overrun or the node is overloaded, and back up when there
+    is headroom. A {"type": "pacing"} JSON message with the producer's measured stage
+    times and settings, plus this viewer's skipped frames, is sent every STATS_INTERVAL seconds.
     """
-    await websocket.accept()
-    cap = cv2.VideoCapture(0)  # Default webcam
+    params = websocket.query_params
+    response_format = params.get("format", detection_formats.FORMAT_OBJECTS)
+    source = int(params.get("source", 0))
+    max_fps = float(params.get("fps", 0)) or None
+    subprotocol = negotiate_stream_protocol(websocket)
+    await websocket.accept(subprotocol=subprotocol)
     
-    if not cap.isOpened():
-        await websocket.send_json({"error": "Cannot open webcam"})
+    try:
+        entry = await model_registry.acquire(params.get("model"))
+    except Exception as e:
+        await websocket.send_json({"error": str(e)})
         await websocket.close()
         return
     
+    broadcaster = get_webcam_broadcaster(source, entry.name)
+    subscription = await broadcaster.subscribe()
+    # Viewers only listen, so watch for the close to stop waiting on frames
+    watcher = asyncio.create_task(wait_for_disconnect(websocket))
+    watcher.add_done_callback(lambda _: subscription.offer(END))
     try:
+        await send_stream_hello(websocket, subprotocol, entry.names)
+        last_sent = 0.0
+        last_report = time.monotonic()
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            item = await subscription.get()
+            if item is END:
+                if broadcaster.error and not watcher.done():
+                    await websocket.send_json({"error": broadcaster.error})
                 break
+            if max_fps and time.monotonic() - last_sent < 1.0 / max_fps:
+                continue
+            last_sent = time.monotonic()
+            seq, arrays, frame_data = item
+            await send_detection_frame(websocket, subprotocol, response_format, seq, arrays, frame_data, entry.names)
             
-            # Resize frame for faster processing
-            frame = cv2.resize(frame, (640, 480))
-            
-            # Run detection
-            results = model(frame, conf=CONFIDENCE_THRESHOLD)
-            result = results[0]
-            
-            # Extract detections
-            detections = []
-            for box in result.boxes:
-                detections.append({
-                    "class": model.names[int(box.cls[0])],
-                    "confidence": float(box.conf[0]),
-                    "bbox": [float(x) for x in box.xyxy[0]]
+            if time.monotonic() - last_report >= STATS_INTERVAL:
+                last_report = time.monotonic()
+                await websocket.send_json({
+                    "type": "pacing",
+                    **broadcaster.producer_stats,
+                    "viewers": broadcaster.stats()["viewers"],
+                    "skipped": subscription.skipped,
                 })
-            
-            # Draw annotations
-            annotated_frame = result.plot()
-            
-            # Encode frame to JPEG
-            _, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            frame_data = buffer.tobytes()
-            
-            # Send frame and detections
-            await websocket.send_json({
-                "type": "detections",
-                "count": len(detections),
-                "objects": detections,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # Send image as base64
-            await websocket.send_text(f"data:image/jpeg;base64,{base64.b64encode(frame_data).decode()}")
-            
-            await asyncio.sleep(0.03)  # ~30 FPS
     
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        await websocket.send_json({"error": str(e)})
+        try:
+            await websocket.send_json({"error": str(e)})
+        except Exception:
+            pass
     finally:
-        cap.release()
+        watcher.cancel()
+        await broadcaster.unsubscribe(subscription)
+        model_registry.release(entry)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+def annotate_frame(result, jpeg_quality: int = 70) -> bytes:
+    """Draw detections and JPEG-encode the frame (blocking)"""
+    annotated = timed_stage("push", "plot", result.plot)
+    _, buffer = timed_stage("push", "encode", cv2.imencode, '.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return buffer.tobytes()
+
+def decode_pushed_frame(message: Dict) -> Optional[bytes]:
+    """Encoded image bytes from a binary message or a data:image/...;base64 text message"""
+    if message.get("bytes"):
+        return message["bytes"]
+    text = message.get("text") or ""
+    if text.startswith("data:image") and "," in text:
+        return base64.b64decode(text.split(",", 1)[1])
+    return None
+
+def is_end_message(message: Dict) -> bool:
+    """A {"type": "end"} text message: the client has sent its last frame"""
+    text = message.get("text") or ""
+    if not text.startswith("{"):
+        return False
+    try:
+        return json.loads(text).get("type") == "end"
+    except (ValueError, AttributeError):
+        return False
+
+@app.websocket("/ws/detect")
+async def websocket_detect(websocket: WebSocket):
+    """
+    WebSocket endpoint for detection on frames pushed by the client.
+    
+    Send encoded frames (JPEG/PNG) as binary messages, or as data:image base64 text.
+    Each connection keeps only the newest unprocessed frame: frames that arrive
+    while inference is busy replace the waiting one and are counted as dropped.
+    Send {"type": "end"} after the last frame: the server still answers the frame
+    waiting in the slot, sends the final stats and closes the connection.
+    
+    Query parameters:
+    - confidence: Detection confidence threshold (0.0-1.0)
+    - annotate: 1 to also receive the annotated frame (default 0, detections only)
+    - format: "objects" or "columnar" for text-mode detection messages
+    - motion_threshold: Reuse the previous detections instead of running the model
+      while frames differ from the last inferred one by less than this (0-1, 0 = off)
+    - model: Registered model to use (default model if omitted)
+    
+    Detections are sent in the negotiated protocol ("yolo.binary.v1" or text);
+    "frame" (text) or the header seq (binary) is the index of the frame they belong to.
+    A {"type": "stats"} message with received/dropped/processed (and motion-skipped)
+    counts follows every STATS_INTERVAL seconds and when the stream ends.
+    """
+    params = websocket.query_params
+    confidence = float(params.get("confidence", CONFIDENCE_THRESHOLD))
+    annotate = params.get("annotate", "0") in ("1", "true")
+    response_format = params.get("format", detection_formats.FORMAT_OBJECTS)
+    gate = MotionGate(float(params.get("motion_threshold", MOTION_THRESHOLD)))
+    # Detections-only streams decode frames straight to the model input size
+    fast_decode = FAST_DECODE and not annotate
+    subprotocol = negotiate_stream_protocol(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    
+    try:
+        entry = await model_registry.acquire(params.get("model"))
+    except Exception as e:
+        await websocket.send_json({"error": str(e)})
         await websocket.close()
+        return
+    await send_stream_hello(websocket, subprotocol, entry.names)
+    
+    slot = LatestFrameSlot()
+    
+    def stream_stats() -> Dict:
+        return {"type": "stats", **slot.stats(), **(gate.stats() if gate.enabled else {})}
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if is_end_message(message):
+                    slot.end()
+                    break
+                data = decode_pushed_frame(message)
+                if data and slot.put(data):
+                    FRAMES_DROPPED.inc(1, "push", "replaced")
+        finally:
+            if not slot.closed:
+                slot.close()
+    
+    async def send_stats():
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            await websocket.send_json(stream_stats())
+    
+    receiver = asyncio.create_task(receive_frames())
+    reporter = asyncio.create_task(send_stats())
+    try:
+        while True:
+            item = await slot.get()
+            if item is None:
+                break
+            index, data = item
+            letterbox = None
+            try:
+                if fast_decode:
+                    letterbox = await inference_executor.run(timed_stage, "push", "decode", decode_letterboxed, data)
+                    img = letterbox.image if letterbox is not None else None
+                else:
+                    img = await inference_executor.run(timed_stage, "push", "decode", decode_image, data)
+                if img is None:
+                    slot.drop_taken()
+                    FRAMES_DROPPED.inc(1, "push", "invalid")
+                    await websocket.send_json({"type": "error", "frame": index, "error": "Invalid image frame"})
+                    continue
+                if gate.check(img) or gate.last is None:
+                    with STAGE_SECONDS.time("push", "model"):
+                        result = gate.last = await entry.batcher.submit(img, confidence)
+                else:
+                    # Scene unchanged since the last inferred frame
+                    result = detection_formats.carry_over(gate.last, img)
+                frame_data = await inference_executor.run(annotate_frame, result) if annotate else None
+            except QueueFullError:
+                # Overloaded: skip this frame; the next one is already on its way
+                slot.drop_taken()
+                FRAMES_DROPPED.inc(1, "push", "overloaded")
+                continue
+            except asyncio.CancelledError:
+                # A batch may still be reading the buffer; leave it to the garbage collector
+                letterbox = None
+                raise
+            finally:
+                # Whatever happened, the model is done with the buffer
+                if letterbox is not None:
+                    letterbox.release()
+            slot.processed += 1
+            FRAMES_TOTAL.inc(1, "push")
+            arrays = detection_formats.extract(result)
+            if letterbox is not None:
+                # Gating and carried-over boxes work on the letterboxed frame; clients get original coordinates
+                arrays = letterbox.to_original(arrays)
+            with STAGE_SECONDS.time("push", "send"):
+                await send_detection_frame(
+                    websocket,
+                    subprotocol,
+                    response_format,
+                    index,
+                    arrays,
+                    frame_data,
+                    entry.names,
+                    extra={"frame": index},
+                )
+        reporter.cancel()
+        await websocket.send_json(stream_stats())
+    except Exception as e:
+        try:
+            await websocket.send_json({"error": str(e)})
+        except Exception:
+            pass
+    finally:
+        receiver.cancel()
+        reporter.cancel()
+        model_registry.release(entry)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
 @app.get("/detect/webcam-html")
 async def webcam_html():
@@ -547,18 +1782,24 @@ async def webcam_html():
             <div class="info-section">
                 <h2>Detections</h2>
                 <p>Status: <span id="status" style="color: #ff6b6b;">Disconnected</span></p>
+                <p>Pacing: <span id="pacing">-</span></p>
                 <div id="detections"></div>
             </div>
         </div>
         
         <script>
+            // Binary frame protocol (see stream_protocol.py); the server falls back to text if not offered
+            const BINARY_PROTOCOL = 'yolo.binary.v1';
             let ws = null;
             let isStreaming = false;
+            let classNames = {};
+            let frameUrl = null;
             
             function startStream() {
                 if (isStreaming) return;
                 
-                ws = new WebSocket("ws://" + window.location.host + "/ws/webcam");
+                ws = new WebSocket("ws://" + window.location.host + "/ws/webcam", [BINARY_PROTOCOL]);
+                ws.binaryType = 'arraybuffer';
                 ws.onopen = () => {
                     document.getElementById('status').textContent = 'Connected';
                     document.getElementById('status').style.color = '#51cf66';
@@ -568,11 +1809,20 @@ async def webcam_html():
                 };
                 
                 ws.onmessage = (event) => {
-                    if (event.data.startsWith('data:image')) {
+                    if (event.data instanceof ArrayBuffer) {
+                        handleBinaryFrame(event.data);
+                    } else if (event.data.startsWith('data:image')) {
                         document.getElementById('stream').src = event.data;
                     } else {
                         const data = JSON.parse(event.data);
-                        updateDetections(data);
+                        if (data.type === 'hello') {
+                            classNames = data.class_names;
+                        } else if (data.type === 'pacing') {
+                            document.getElementById('pacing').textContent =
+                                `${data.fps} fps, ${data.frame_ms} ms/frame, ${data.imgsz}px, JPEG ${data.jpeg_quality}`;
+                        } else {
+                            updateDetections(data);
+                        }
                     }
                 };
                 
@@ -596,6 +1846,37 @@ async def webcam_html():
                 }
             }
             
+            function handleBinaryFrame(buffer) {
+                // Header (little-endian): magic(2) version(1) flags(1) seq(u32) timestamp(f64) count(u32)
+                const view = new DataView(buffer);
+                const count = view.getUint32(16, true);
+                const objects = [];
+                let offset = 20;
+                // Detections: class_id(u16) score(f32) x1 y1 x2 y2(f32), 22 bytes each
+                for (let i = 0; i < count; i++) {
+                    const classId = view.getUint16(offset, true);
+                    objects.push({
+                        class: classNames[classId] || String(classId),
+                        confidence: view.getFloat32(offset + 2, true),
+                        bbox: [
+                            view.getFloat32(offset + 6, true),
+                            view.getFloat32(offset + 10, true),
+                            view.getFloat32(offset + 14, true),
+                            view.getFloat32(offset + 18, true)
+                        ]
+                    });
+                    offset += 22;
+                }
+                updateDetections({count: objects.length, objects: objects});
+                
+                // The rest of the message is the JPEG itself
+                if (frameUrl) {
+                    URL.revokeObjectURL(frameUrl);
+                }
+                frameUrl = URL.createObjectURL(new Blob([buffer.slice(offset)], {type: 'image/jpeg'}));
+                document.getElementById('stream').src = frameUrl;
+            }
+            
             function updateDetections(data) {
                 const container = document.getElementById('detections');
                 if (data.count === 0) {
@@ -0,0 +1,190 @@
+# batching.py
+"""
+Request-coalescing micro-batcher for single-image detection.
+Concurrent requests are collected for a few milliseconds (or until the
+batch is full) and run through the model in one batched forward pass.
+
+With a bounded executor, admission happens per caller, not per batch: each
+caller reserves an executor slot when it submits (and is rejected there,
+exactly as an individual call would be), and the batch then runs on one of
+its callers' slots and hands the rest back. A formed batch is therefore
+never rejected as a whole.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+import numpy as np
+
+
+class _PendingRequest:
+    """One caller waiting for its slice of a batch"""
+
+    __slots__ = ("image", "confidence", "future")
+
+    def __init__(self, image: np.ndarray, confidence: float, future: asyncio.Future):
+        self.image = image
+        self.confidence = confidence
+        self.future = future
+
+
+def filter_by_confidence(result: Any, confidence: float) -> Any:
+    """
+    Drop boxes below `confidence` from an ultralytics Results object.
+
+    NMS keeps boxes in descending score order, so a low-confidence box can
+    never suppress a higher one. Running the batch at the lowest requested
+    threshold and filtering afterwards therefore gives each caller exactly
+    the boxes it would have got from a call with its own threshold.
+    """
+    if result.boxes is None or len(result.boxes) == 0:
+        return result
+    return result[result.boxes.conf >= confidence]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-image requests into batched model calls.
+
+    Args:
+        predict_batch: Blocking callable(images, confidence) -> list of Results,
+            one per image, run in a worker thread
+        max_batch_size: Upper bound on images per forward pass
+        max_wait_ms: How long the first request in a batch may wait for company
+        run_blocking: Optional coroutine function(fn, *args) used to run the
+            batch off the event loop; defaults to the loop's default executor
+        reserve: Optional callable taking an executor slot for one caller, raising
+            (e.g. QueueFullError) when there is none; requires `unreserve`, and
+            `run_blocking` must then accept ``reserved=True`` (InferenceExecutor.run does)
+        unreserve: Gives back a slot taken by `reserve`
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[List[np.ndarray], float], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        run_blocking: Optional[Callable[..., Awaitable[Any]]] = None,
+        reserve: Optional[Callable[[], None]] = None,
+        unreserve: Optional[Callable[[], None]] = None,
+    ):
+        self.predict_batch = predict_batch
+        self.run_blocking = run_blocking
+        self.reserve = reserve
+        self.unreserve = unreserve
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches_run = 0
+        self.requests_served = 0
+
+    async def start(self):
+        """Start the background batching loop on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any request still waiting"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            self._unreserve(1)
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, image: np.ndarray, confidence: float) -> Any:
+        """Queue one image and wait for its Results"""
+        if self._task is None:
+            raise RuntimeError("Batcher is not running")
+        if self.reserve is not None:
+            # Rejected here, on its own, rather than with a whole batch at flush time
+            self.reserve()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingRequest(image, confidence, future))
+        return await future
+
+    def _unreserve(self, count: int):
+        if self.reserve is not None:
+            for _ in range(count):
+                self.unreserve()
+
+    def stats(self) -> dict:
+        """Counters for tuning max_batch_size / max_wait_ms"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "avg_batch_size": (
+                self.requests_served / self.batches_run if self.batches_run else 0.0
+            ),
+        }
+
+    async def _collect(self) -> List[_PendingRequest]:
+        """Wait for one request, then gather more until full or max_wait expires"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Anything that arrived in the meantime rides along for free
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            collected = await self._collect()
+            # Callers that gave up (client disconnect, timeout) don't need a slot
+            batch = [p for p in collected if not p.future.done()]
+            # The batch runs on one caller's executor slot; the others go back
+            self._unreserve(len(collected) - 1 if batch else len(collected))
+            if not batch:
+                continue
+
+            min_conf = min(p.confidence for p in batch)
+            images = [p.image for p in batch]
+            try:
+                if self.reserve is not None:
+                    results = await self.run_blocking(self.predict_batch, images, min_conf, reserved=True)
+                elif self.run_blocking is not None:
+                    results = await self.run_blocking(self.predict_batch, images, min_conf)
+                else:
+                    results = await loop.run_in_executor(
+                        None, self.predict_batch, images, min_conf
+                    )
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.requests_served += len(batch)
+            for pending, result in zip(batch, results):
+                if pending.future.done():
+                    continue
+                try:
+                    if pending.confidence > min_conf:
+                        result = filter_by_confidence(result, pending.confidence)
+                except Exception as e:
+                    pending.future.set_exception(e)
+                    continue
+                pending.future.set_result(result)
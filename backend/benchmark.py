@@ -0,0 +1,584 @@
+# benchmark.py
+"""
+Reproducible load test for /detect/image, /detect/video and /ws/detect.
+
+Runs the FastAPI app in-process (through Starlette's TestClient, startup
+events included) or against a running server (--url), drives each scenario
+with a fixed number of requests at a configurable concurrency, and reports
+throughput and p50/p95/p99 latency. When the target exposes /metrics, the
+mean server-side time per stage over the scenario is included, so a
+regression can be traced to decode, model, plot, ...
+
+Inputs are synthetic and seeded: JPEGs with a few filled shapes on a
+gradient (every request gets different bytes, so the result cache doesn't
+turn the run into a cache benchmark unless --cache-hits is given) and an MP4
+of moving shapes.
+
+Stub-model mode (--stub-ms, or STUB_MODEL_MS on the server) replaces every
+model with StubModel below: it sleeps for the given time per image and
+returns fixed synthetic boxes, so the serving path (upload, decode,
+batching, queueing, plot, encode, JSON) can be measured on any CPU box
+without final.pt. Stub numbers measure the server, not the model.
+
+Results are written as JSON (--output); --compare checks them against an
+earlier run and exits with status 1 when throughput dropped or p95 latency
+grew by more than --tolerance.
+
+    python benchmark.py --stub-ms 20 --output bench.json
+    python benchmark.py --stub-ms 20 --compare bench.json
+    STUB_MODEL_MS=20 python api.py & python benchmark.py --url http://localhost:8000
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+SCENARIOS = ("image", "video", "websocket")
+
+STUB_NAMES = {0: "person", 1: "car", 2: "dog"}
+# Fractional x1, y1, x2, y2, confidence, class of the boxes every stub prediction returns
+STUB_BOXES = np.array([
+    [0.10, 0.15, 0.35, 0.80, 0.92, 0],
+    [0.45, 0.40, 0.90, 0.75, 0.71, 1],
+    [0.60, 0.05, 0.75, 0.30, 0.45, 2],
+], np.float32)
+
+
+class StubModel:
+    """
+    Stands in for a YOLO model: sleeps `ms_per_image` per image (the GIL is
+    released, as in a real forward pass) and returns STUB_BOXES scaled to
+    each image, as ultralytics Results.
+    """
+
+    def __init__(self, ms_per_image: float):
+        self.ms_per_image = ms_per_image
+        self.names = dict(STUB_NAMES)
+
+    def __call__(self, source, conf: float = 0.25, **kwargs):
+        from detections import to_results
+
+        images = source if isinstance(source, (list, tuple)) else [source]
+        time.sleep(self.ms_per_image * len(images) / 1000.0)
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            rows = STUB_BOXES[STUB_BOXES[:, 4] >= conf].copy()
+            rows[:, [0, 2]] *= width
+            rows[:, [1, 3]] *= height
+            result = to_results(image, rows, self.names)
+            result.speed = {"preprocess": 0.0, "inference": self.ms_per_image, "postprocess": 0.0}
+            results.append(result)
+        return results
+
+
+def stub_entry(name: str, path: Path, ms_per_image: float):
+    """A registry entry backed by StubModel (see STUB_MODEL_MS in api.py)"""
+    from registry import ModelEntry
+
+    # Same keys load_entry reports, so /model-info and /health work unchanged
+    info = {
+        "artifact": None,
+        "import_ms": 0.0,
+        "export_ms": 0.0,
+        "load_ms": 0.0,
+        "warmup_ms": None,
+        "stub_ms_per_image": ms_per_image,
+    }
+    return ModelEntry(name, path, StubModel(ms_per_image), "stub", 0, f"stub-{ms_per_image}", info=info)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+
+def synthetic_frame(rng: np.random.RandomState, width: int, height: int, t: float = 0.0) -> np.ndarray:
+    """A gradient with a few filled shapes; `t` moves the shapes (for video frames)"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[..., 0] = (x * 0.6 + y * 0.4).astype(np.uint8)
+    frame[..., 1] = (255 - x * 0.5).astype(np.uint8)
+    frame[..., 2] = (y * 0.7).astype(np.uint8)
+    for _ in range(5):
+        cx = int((rng.uniform(0.1, 0.9) + 0.1 * t) % 1.0 * width)
+        cy = int(rng.uniform(0.1, 0.9) * height)
+        size = int(rng.uniform(0.05, 0.2) * min(width, height))
+        color = tuple(int(c) for c in rng.randint(0, 256, 3))
+        if rng.rand() < 0.5:
+            cv2.rectangle(frame, (cx - size, cy - size), (cx + size, cy + size), color, -1)
+        else:
+            cv2.circle(frame, (cx, cy), size, color, -1)
+    return frame
+
+
+def synthetic_jpegs(count: int, width: int, height: int, seed: int, quality: int = 90) -> List[bytes]:
+    """`count` distinct JPEGs (same seed, same bytes)"""
+    rng = np.random.RandomState(seed)
+    base = synthetic_frame(rng, width, height)
+    images = []
+    for i in range(count):
+        frame = base.copy()
+        # A few noisy pixels per image make every upload (and its cache key) unique
+        frame[:4, :64] = rng.randint(0, 256, (4, 64, 3))
+        images.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return images
+
+
+def synthetic_video(frames: int, width: int, height: int, seed: int, fps: float = 30.0) -> bytes:
+    """MP4 of shapes drifting across a gradient"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.mp4"
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        for i in range(frames):
+            writer.write(synthetic_frame(np.random.RandomState(seed), width, height, t=i / fps))
+        writer.release()
+        return path.read_bytes()
+
+
+# ---------------------------------------------------------------------------
+# Targets
+
+class _ServerWebSocket:
+    """The TestClient WebSocket interface over a `websockets` sync connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def send_bytes(self, data: bytes):
+        self.connection.send(data)
+
+    def receive_text(self) -> str:
+        return self.connection.recv()
+
+
+class Target:
+    """An in-process app (TestClient) or a server (httpx + websockets), behind one interface"""
+
+    def __init__(self, client, ws_url: Optional[str] = None):
+        self.client = client
+        self.ws_url = ws_url
+
+    def post(self, path: str, **kwargs):
+        return self.client.post(path, **kwargs)
+
+    def get(self, path: str, **kwargs):
+        return self.client.get(path, **kwargs)
+
+    @contextmanager
+    def websocket(self, path: str):
+        if self.ws_url is None:
+            with self.client.websocket_connect(path) as ws:
+                yield ws
+        else:
+            from websockets.sync.client import connect
+
+            with connect(self.ws_url + path, max_size=None) as connection:
+                yield _ServerWebSocket(connection)
+
+    def wait_ready(self, timeout: float = 300.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if self.get("/ready").status_code == 200:
+                    return
+            except Exception:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Target did not become ready (is the model loadable?)")
+            time.sleep(0.2)
+
+    def scrape_metrics(self) -> Optional[str]:
+        try:
+            response = self.get("/metrics")
+        except Exception:
+            return None
+        return response.text if response.status_code == 200 else None
+
+
+@contextmanager
+def open_target(url: Optional[str], stub_ms: Optional[float]):
+    if url:
+        import httpx
+
+        if stub_ms is not None:
+            print("--stub-ms only applies in-process; start the server with STUB_MODEL_MS instead")
+
+        with httpx.Client(base_url=url, timeout=600) as client:
+            yield Target(client, ws_url=re.sub(r"^http", "ws", url.rstrip("/")))
+        return
+    if stub_ms is not None:
+        # Read by api.py at import
+        os.environ["STUB_MODEL_MS"] = str(stub_ms)
+    sys.path.insert(0, str(Path(__file__).parent))
+    from fastapi.testclient import TestClient
+
+    import api
+
+    with TestClient(api.app) as client:
+        yield Target(client)
+
+
+# ---------------------------------------------------------------------------
+# Load generation and statistics
+
+def warm_up(call: Callable[[int], Tuple[bool, str]], count: int):
+    """Unmeasured calls (negative indices) so imports and first-call costs stay out of the numbers"""
+    for i in range(count):
+        call(-1 - i)
+
+
+def with_server_stages(target: "Target", run: Callable[[], Dict]) -> Dict:
+    """run() plus the server-side stage means over it, from /metrics before and after"""
+    before = target.scrape_metrics()
+    stats = run()
+    stats["server_stages_ms"] = stage_means(before, target.scrape_metrics())
+    return stats
+
+
+def run_load(call: Callable[[int], Tuple[bool, str]], total: int, concurrency: int) -> Dict:
+    """
+    Run call(i) for i in range(total) on `concurrency` threads.
+    call returns (ok, outcome), outcome being e.g. the status code.
+    """
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok, outcome = call(i)
+            except Exception as e:
+                ok, outcome = False, type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                errors += not ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "outcomes": outcomes,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 2) if wall > 0 else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {}
+    ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "min": round(float(ms.min()), 2),
+        "mean": round(float(ms.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+_HISTOGRAM_LINE = re.compile(r"^(yolo_stage_seconds|yolo_model_seconds)_(sum|count)\{(.*)\} (\S+)$")
+
+
+def _histogram_totals(text: Optional[str]) -> Dict[str, List[float]]:
+    """"path/stage" (or "model/stage") -> [sum seconds, count] from a /metrics scrape"""
+    totals: Dict[str, List[float]] = {}
+    for line in (text or "").splitlines():
+        match = _HISTOGRAM_LINE.match(line)
+        if match is None:
+            continue
+        _, field, labels, value = match.groups()
+        key = "/".join(re.findall(r'="([^"]*)"', labels))
+        totals.setdefault(key, [0.0, 0.0])[1 if field == "count" else 0] = float(value)
+    return totals
+
+
+def stage_means(before: Optional[str], after: Optional[str]) -> Optional[Dict]:
+    """Mean ms and count per server-side stage between two /metrics scrapes"""
+    if after is None:
+        return None
+    start = _histogram_totals(before)
+    stages = {}
+    for key, (total, count) in _histogram_totals(after).items():
+        total_before, count_before = start.get(key, (0.0, 0.0))
+        if count > count_before:
+            stages[key] = {
+                "mean_ms": round((total - total_before) / (count - count_before) * 1000.0, 3),
+                "count": int(count - count_before),
+            }
+    return dict(sorted(stages.items()))
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+
+def bench_image(target: Target, args) -> Dict:
+    width, height = args.image_size
+    count = 1 if args.cache_hits else args.requests + args.warmup
+    images = synthetic_jpegs(count, width, height, args.seed)
+    params = {"annotate": str(args.annotate).lower(), "format": args.format}
+
+    def call(i: int):
+        data = images[i % len(images)]
+        response = target.post("/detect/image", params=params, files={"file": ("bench.jpg", data, "image/jpeg")})
+        return response.status_code == 200, str(response.status_code)
+
+    warm_up(call, args.warmup)
+    stats = with_server_stages(target, lambda: run_load(call, args.requests, args.concurrency))
+    stats.update(image_size=f"{width}x{height}", image_bytes=int(np.mean([len(i) for i in images])))
+    return stats
+
+
+def bench_video(target: Target, args) -> Dict:
+    width, height = args.video_size
+    video = synthetic_video(args.video_frames, width, height, args.seed)
+    frames_processed = []
+
+    def call(i: int):
+        response = target.post(
+            "/detect/video",
+            params={"mode": args.video_mode},
+            files={"file": ("bench.mp4", video, "video/mp4")},
+        )
+        if response.status_code == 200 and i >= 0:
+            frames_processed.append(response.json().get("frames_processed", 0))
+        return response.status_code == 200, str(response.status_code)
+
+    warm_up(call, min(args.warmup, 1))
+    stats = with_server_stages(target, lambda: run_load(call, args.video_requests, args.video_concurrency))
+    stats.update(
+        video_frames=args.video_frames,
+        video_size=f"{width}x{height}",
+        video_bytes=len(video),
+        frames_processed=sum(frames_processed),
+        output_fps=round(sum(frames_processed) / stats["wall_s"], 2) if stats["wall_s"] else None,
+    )
+    return stats
+
+
+def bench_websocket(target: Target, args) -> Dict:
+    """
+    One connection per worker, frames sent one at a time: latency is the
+    round trip from sending a frame to receiving its detections.
+    """
+    width, height = args.image_size
+    images = synthetic_jpegs(min(args.ws_frames, 64), width, height, args.seed + 1)
+    annotate = "1" if args.annotate else "0"
+    path = f"/ws/detect?annotate={annotate}&format={args.format}"
+    frames_per_connection = max(1, args.ws_frames // args.concurrency)
+
+    def connection(worker: int, frames: int = frames_per_connection):
+        latencies = []
+        outcomes: Dict[str, int] = {}
+        with target.websocket(path) as ws:
+            for i in range(frames):
+                start = time.perf_counter()
+                ws.send_bytes(images[(worker + i) % len(images)])
+                outcome = _await_detections(ws, annotate == "1")
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                latencies.append(time.perf_counter() - start)
+        return latencies, outcomes
+
+    def run() -> Dict:
+        connection_stats = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(connection, w) for w in range(args.concurrency)]:
+                connection_stats.append(future.result())
+        wall = time.perf_counter() - started
+        return summarize_connections(connection_stats, wall)
+
+    if args.warmup:
+        connection(0, args.warmup)
+    return with_server_stages(target, run)
+
+
+def summarize_connections(connection_stats: List[Tuple[List[float], Dict[str, int]]], wall: float) -> Dict:
+    latencies = [latency for stats, _ in connection_stats for latency in stats]
+    outcomes: Dict[str, int] = {}
+    for _, counts in connection_stats:
+        for outcome, n in counts.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + n
+    return {
+        "frames": len(latencies),
+        "connections": len(connection_stats),
+        "errors": sum(n for outcome, n in outcomes.items() if outcome != "detections"),
+        "outcomes": outcomes,
+        "wall_s": round(wall, 3),
+        "throughput_fps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def _await_detections(ws, annotated: bool) -> str:
+    """Read messages until the detections (and annotated frame) for the frame just sent"""
+    while True:
+        text = ws.receive_text()
+        if not text.startswith("{"):
+            continue
+        message = json.loads(text)
+        kind = message.get("type", "error" if "error" in message else None)
+        if kind == "detections":
+            if annotated:
+                ws.receive_text()
+            return kind
+        if kind == "error":
+            return kind
+
+
+BENCHMARKS = {"image": bench_image, "video": bench_video, "websocket": bench_websocket}
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of `current` against `baseline`: throughput down or p95 up by more than `tolerance`"""
+    regressions = []
+    for name, stats in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for key in ("throughput_rps", "throughput_fps"):
+            if stats.get(key) and base.get(key) and stats[key] < base[key] * (1 - tolerance):
+                regressions.append(f"{name}: {key} {base[key]} -> {stats[key]}")
+        new_p95 = stats.get("latency_ms", {}).get("p95")
+        old_p95 = base.get("latency_ms", {}).get("p95")
+        if new_p95 and old_p95 and new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 latency {old_p95} ms -> {new_p95} ms")
+    return regressions
+
+
+def print_report(report: Dict):
+    print(f"\nTarget: {report['meta']['target']}  stub_ms: {report['meta']['stub_ms']}")
+    for name, stats in report["scenarios"].items():
+        latency = stats.get("latency_ms", {})
+        rate = stats.get("throughput_rps") or stats.get("throughput_fps")
+        unit = "req/s" if "throughput_rps" in stats else "frames/s"
+        print(
+            f"  {name:<10} {rate} {unit}  p50 {latency.get('p50')} ms  p95 {latency.get('p95')} ms  "
+            f"p99 {latency.get('p99')} ms  errors {stats.get('errors')}"
+        )
+
+
+def _size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the detection API")
+    parser.add_argument("--url", help="Server to test (default: run the app in-process)")
+    parser.add_argument("--stub-ms", type=float, help="In-process only: stub model with this many ms per image")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests (image) / connections (websocket)")
+    parser.add_argument("--requests", type=int, default=200, help="Measured /detect/image requests")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    parser.add_argument("--image-size", type=_size, default=(1280, 720), help="WxH of synthetic images")
+    parser.add_argument("--annotate", action="store_true", help="Ask for annotated output (image and websocket)")
+    parser.add_argument("--format", default="objects", help="Detection format: objects or columnar")
+    parser.add_argument("--cache-hits", action="store_true", help="Send the same image every time")
+    parser.add_argument("--video-requests", type=int, default=4)
+    parser.add_argument("--video-concurrency", type=int, default=2)
+    parser.add_argument("--video-frames", type=int, default=90)
+    parser.add_argument("--video-size", type=_size, default=(640, 360))
+    parser.add_argument("--video-mode", default="skip", help="skip or track")
+    parser.add_argument("--ws-frames", type=int, default=200, help="Frames pushed over /ws/detect in total")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON here")
+    parser.add_argument("--compare", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression (default 0.10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {sorted(unknown)}; expected some of {list(SCENARIOS)}")
+        return 2
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "target": args.url or "in-process",
+            "stub_ms": args.stub_ms,
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "scenarios": {},
+    }
+    with open_target(args.url, args.stub_ms) as target:
+        target.wait_ready()
+        for name in scenarios:
+            print(f"Running {name}...", flush=True)
+            report["scenarios"][name] = BENCHMARKS[name](target, args)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# broadcast.py
+"""
+Fan-out of one live producer to many viewers.
+
+A FrameBroadcaster runs a single producer coroutine (e.g. capture + detect +
+encode for one camera) while at least one viewer is subscribed, and hands
+every published item to all subscribers. Each subscriber has its own small
+bounded queue; when a viewer falls behind, its oldest queued item is
+discarded (and counted) instead of blocking the producer or other viewers.
+The producer work is therefore done once per frame regardless of how many
+viewers are connected.
+
+Subscribing and unsubscribing are serialized by a lock. When the last viewer
+leaves, the producer is cancelled and awaited under that lock, so a viewer
+arriving meanwhile waits for it to stop completely (e.g. release its camera)
+and then starts a fresh producer, instead of being attached to the dying one.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Sentinel delivered to subscribers when the producer stops
+END = object()
+
+Producer = Callable[[Callable[[Any], None], Callable[[Dict], None]], Awaitable[None]]
+
+
+class Subscription:
+    """One viewer's view of a broadcaster"""
+
+    def __init__(self, queue_size: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.delivered = 0
+        self.skipped = 0
+
+    def offer(self, item: Any) -> bool:
+        """Enqueue without blocking, discarding the oldest item if the viewer is behind; True if one was"""
+        skipped = self._queue.full()
+        if skipped:
+            self._queue.get_nowait()
+            self.skipped += 1
+        self._queue.put_nowait(item)
+        return skipped
+
+    async def get(self) -> Any:
+        """Next item, or END once the producer has stopped"""
+        item = await self._queue.get()
+        if item is not END:
+            self.delivered += 1
+        return item
+
+
+class FrameBroadcaster:
+    """
+    Shares one producer between subscribers.
+
+    `produce(publish, report)` is started on the first subscription and
+    cancelled when the last subscriber leaves. It calls `publish(item)` for
+    every item and may call `report(stats)` to expose its own stats.
+    """
+
+    def __init__(self, produce: Producer, queue_size: int = 2):
+        self._produce = produce
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.producer_stats: Dict = {}
+        self.published = 0
+        self.error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def subscribe(self) -> Subscription:
+        """Add a viewer, starting the producer if it isn't running (after a stopping one has finished)"""
+        async with self._lock:
+            sub = Subscription(self.queue_size)
+            self._subscribers.add(sub)
+            if not self.running:
+                self.error = None
+                self.producer_stats = {}
+                self._task = asyncio.create_task(self._run())
+            return sub
+
+    async def unsubscribe(self, sub: Subscription):
+        """Remove a viewer; the last one out stops the producer and waits until it has finished"""
+        async with self._lock:
+            self._subscribers.discard(sub)
+            if self._subscribers or not self.running:
+                return
+            task = self._task
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def publish(self, item: Any) -> int:
+        """Hand `item` to every subscriber; returns how many had to discard an older item"""
+        self.published += 1
+        return sum(sub.offer(item) for sub in list(self._subscribers))
+
+    def _report(self, stats: Dict):
+        self.producer_stats = stats
+
+    async def _run(self):
+        try:
+            await self._produce(self.publish, self._report)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            for sub in list(self._subscribers):
+                sub.offer(END)
+
+    async def close(self):
+        """Stop the producer and wake all subscribers"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "viewers": len(self._subscribers),
+            "published": self.published,
+            "error": self.error,
+            "producer": self.producer_stats,
+        }
@@ -0,0 +1,105 @@
+# bulk.py
+"""
+Input side of bulk detection: images uploaded directly or packed in zip/tar
+archives.
+
+`iter_images` walks the uploads one entry at a time and reads an image's
+bytes only when it is its turn, so an archive of any size holds at most one
+entry in memory here. Tar archives (optionally compressed) are read as a
+stream; zip archives are read through their central directory from the
+spooled upload. Entries that aren't images by extension (directories,
+README files, macOS resource forks) are skipped silently; entries over the
+size limit and unreadable archives are reported as items with an error.
+A corrupt zip member is reported on its own and the rest of the archive is
+still read; a corrupt tar stream ends that archive with an error item, since
+nothing after the damage can be located.
+"""
+
+import io
+import lzma
+import tarfile
+import zipfile
+import zlib
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# Corrupt containers and compressed data (gzip.BadGzipFile and bz2 errors are OSErrors)
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error, lzma.LZMAError, OSError)
+
+
+class BulkItem(NamedTuple):
+    """One image to detect on: its name, and either its bytes or why it can't be read"""
+
+    name: str
+    data: Optional[bytes]
+    error: Optional[str] = None
+
+
+def is_image_name(name: str) -> bool:
+    path = PurePosixPath(name)
+    if path.name.startswith("._") or "__MACOSX" in path.parts:
+        return False
+    return path.suffix.lower() in IMAGE_SUFFIXES
+
+
+def _too_large(name: str, size: int, max_bytes: int) -> BulkItem:
+    return BulkItem(name, None, f"Entry of {size} bytes exceeds the {max_bytes // (1024 * 1024)} MB per-image limit")
+
+
+def _iter_zip(archive: str, fh: BinaryIO, max_bytes: int) -> Iterator[BulkItem]:
+    with zipfile.ZipFile(fh) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            name = f"{archive}/{info.filename}"
+            if info.file_size > max_bytes:
+                yield _too_large(name, info.file_size, max_bytes)
+                continue
+            try:
+                data = zf.read(info)
+            except ARCHIVE_ERRORS as e:
+                yield BulkItem(name, None, f"Unreadable archive entry: {e}")
+                continue
+            yield BulkItem(name, data)
+
+
+def _iter_tar(archive: str, fh: BinaryIO, max_bytes: int) -> Iterator[BulkItem]:
+    # "r|*": sequential stream, any compression
+    with tarfile.open(fileobj=fh, mode="r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not is_image_name(member.name):
+                continue
+            name = f"{archive}/{member.name}"
+            if member.size > max_bytes:
+                yield _too_large(name, member.size, max_bytes)
+                continue
+            yield BulkItem(name, tf.extractfile(member).read())
+
+
+def iter_images(uploads: Iterable[Tuple[str, BinaryIO]], max_bytes: int) -> Iterator[BulkItem]:
+    """
+    Images from (filename, file) uploads, in upload and archive order (blocking reads).
+    Each upload is an image, a zip archive or a tar archive.
+    """
+    for filename, fh in uploads:
+        try:
+            if zipfile.is_zipfile(fh):
+                fh.seek(0)
+                yield from _iter_zip(filename, fh, max_bytes)
+                continue
+            fh.seek(0)
+            if filename.lower().endswith(TAR_SUFFIXES):
+                yield from _iter_tar(filename, fh, max_bytes)
+                continue
+        except ARCHIVE_ERRORS as e:
+            yield BulkItem(filename, None, f"Unreadable archive: {e}")
+            continue
+        size = fh.seek(0, io.SEEK_END)
+        fh.seek(0)
+        if size > max_bytes:
+            yield _too_large(filename, size, max_bytes)
+            continue
+        yield BulkItem(filename, fh.read())
@@ -0,0 +1,153 @@
+# cache.py
+"""
+Content-addressed cache for /detect/image results.
+
+Entries are keyed by a hash of the uploaded bytes, the confidence threshold
+and a fingerprint of the model weights. A hit returns the stored detections
+and the id of the annotated file already on disk, so the model is not run.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+def model_fingerprint(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a weights file, so cached results die with the model that produced them"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    Two-tier cache: an in-memory LRU bounded by bytes, plus an optional disk tier.
+
+    Disk entries are written next to the annotated images as ``cache_<key>.json``;
+    the API indexes them under the file id they point to, so they expire together.
+
+    Args:
+        max_bytes: Budget for the in-memory tier (approximate, based on JSON size)
+        results_dir: Directory holding the annotated files entries refer to
+        disk: Whether to persist entries to disk as well
+    """
+
+    def __init__(self, max_bytes: int, results_dir: Path, disk: bool = False):
+        self.max_bytes = max(0, int(max_bytes))
+        self.results_dir = Path(results_dir)
+        self.disk = disk
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.disk
+
+    def key_for(self, data, confidence: float, fingerprint: str = "") -> str:
+        """Cache key for raw upload bytes (any buffer) at a given confidence, for the model with `fingerprint`"""
+        digest = hashlib.sha256(data)
+        digest.update(f"|conf={confidence:.6f}|model={fingerprint}".encode())
+        return digest.hexdigest()
+
+    def disk_path(self, key: str) -> Path:
+        return self.results_dir / f"cache_{key}.json"
+
+    def _file_exists(self, entry: Dict) -> bool:
+        """Check the annotated file is still there (and refresh its modification time)"""
+        try:
+            os.utime(self.results_dir / entry["output_filename"])
+            return True
+        except OSError:
+            return False
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached entry, or None; entries whose annotated file is gone are dropped"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+        if item is not None:
+            entry = item[0]
+            if self._file_exists(entry):
+                self.hits += 1
+                return entry
+            self._remove(key)
+
+        if self.disk:
+            path = self.disk_path(key)
+            try:
+                with open(path, "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if entry is not None:
+                if self._file_exists(entry):
+                    self.disk_hits += 1
+                    self._store(key, entry)
+                    return entry
+                path.unlink(missing_ok=True)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: Dict):
+        """Store an entry with at least `output_filename`, `file_id` and `detections`"""
+        self._store(key, entry)
+        if self.disk:
+            path = self.disk_path(key)
+            tmp = path.with_suffix(".tmp")
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Cache write error: {e}")
+
+    def _store(self, key: str, entry: Dict):
+        size = len(json.dumps(entry))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (entry, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        with self._lock:
+            entries = len(self._entries)
+            used = self._bytes
+        return {
+            "entries": entries,
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "disk_tier": self.disk,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
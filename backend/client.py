@@ -12,6 +12,11 @@ from pathlib import Path
 from typing import Optional, List, Dict, Tuple
 import websockets
 
+from stream_protocol import BINARY_SUBPROTOCOL, decode_frame, to_stream_objects
+
+# Seconds push_frames waits for the server's final stats after sending the last frame
+PUSH_END_TIMEOUT = 10.0
+
 
 class YOLOClient:
     """Synchronous client for YOLO Detection API"""
@@ -32,16 +37,18 @@ class YOLOClient:
         response.raise_for_status()
         return response.json()
     
-    def get_model_info(self) -> Dict:
-        """Get model information including classes"""
-        response = self.session.get(f"{self.api_url}/model-info")
+    def get_model_info(self, model: Optional[str] = None) -> Dict:
+        """Get model information including classes, and the models the server can load"""
+        response = self.session.get(f"{self.api_url}/model-info", params={'model': model})
         response.raise_for_status()
         return response.json()
     
     def detect_image(
         self,
         image_path: str,
-        confidence: float = 0.5
+        confidence: float = 0.5,
+        model: Optional[str] = None,
+        sliced: bool = False
     ) -> Dict:
         """
         Detect objects in an image
@@ -49,13 +56,16 @@ class YOLOClient:
         Args:
             image_path: Path to image file
             confidence: Detection confidence threshold (0.0-1.0)
+            model: Name of the server model to use (server default if None)
+            sliced: Detect on overlapping tiles (for high-resolution images
+                with small objects); timings are returned under "slicing"
         
         Returns:
             Detection results with bounding boxes and confidences
         """
         with open(image_path, 'rb') as f:
             files = {'file': f}
-            params = {'confidence': confidence}
+            params = {'confidence': confidence, 'model': model, 'sliced': sliced}
             response = self.session.post(
                 f"{self.api_url}/detect/image",
                 files=files,
@@ -67,7 +77,9 @@ class YOLOClient:
     def detect_video(
         self,
         video_path: str,
-        confidence: float = 0.5
+        confidence: float = 0.5,
+        mode: str = "skip",
+        model: Optional[str] = None
     ) -> Dict:
         """
         Process video and detect objects in all frames
@@ -75,13 +87,16 @@ class YOLOClient:
         Args:
             video_path: Path to video file
             confidence: Detection confidence threshold (0.0-1.0)
+            mode: "skip" (every 3rd frame, at a third of the frame rate) or
+                "track" (full frame rate with tracked boxes and track ids)
+            model: Name of the server model to use (server default if None)
         
         Returns:
             Processing results with frame detections
         """
         with open(video_path, 'rb') as f:
             files = {'file': f}
-            params = {'confidence': confidence}
+            params = {'confidence': confidence, 'mode': mode, 'model': model}
             response = self.session.post(
                 f"{self.api_url}/detect/video",
                 files=files,
@@ -89,7 +104,96 @@ class YOLOClient:
             )
         response.raise_for_status()
         return response.json()
-    
+
+    def submit_video_job(
+        self,
+        video_path: str,
+        confidence: float = 0.5,
+        mode: str = "skip",
+        model: Optional[str] = None
+    ) -> Dict:
+        """
+        Queue a video for background detection
+
+        Args:
+            video_path: Path to video file
+            confidence: Detection confidence threshold (0.0-1.0)
+            mode: "skip" or "track", as for detect_video
+            model: Name of the server model to use (server default if None)
+
+        Returns:
+            Job info with job_id, status_url and events_url
+        """
+        with open(video_path, 'rb') as f:
+            files = {'file': f}
+            params = {'confidence': confidence, 'mode': mode, 'model': model}
+            response = self.session.post(
+                f"{self.api_url}/jobs/video",
+                files=files,
+                params=params
+            )
+        response.raise_for_status()
+        return response.json()
+
+    def detect_bulk(
+        self,
+        paths: List[str],
+        confidence: float = 0.5,
+        annotate: bool = False,
+        model: Optional[str] = None
+    ):
+        """
+        Detect objects in many images at once
+
+        Args:
+            paths: Image files and/or zip or tar archives of images
+            confidence: Detection confidence threshold (0.0-1.0)
+            annotate: Also write an annotated image per input (download_url per result)
+            model: Name of the server model to use (server default if None)
+
+        Yields:
+            One dict per image as the server finishes it, then a "summary" dict
+        """
+        handles = [open(path, 'rb') for path in paths]
+        try:
+            files = [('files', (Path(path).name, fh)) for path, fh in zip(paths, handles)]
+            params = {'confidence': confidence, 'annotate': annotate, 'model': model}
+            with self.session.post(
+                f"{self.api_url}/detect/bulk",
+                files=files,
+                params=params,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            for fh in handles:
+                fh.close()
+
+    def get_job(self, job_id: str) -> Dict:
+        """Get job status, progress and (once completed) result"""
+        response = self.session.get(f"{self.api_url}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def cancel_job(self, job_id: str) -> Dict:
+        """Cancel a queued or running job"""
+        response = self.session.delete(f"{self.api_url}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def wait_for_job(self, job_id: str, poll_interval: float = 1.0) -> Dict:
+        """Poll a job until it completes, fails or is cancelled"""
+        import time
+
+        while True:
+            job = self.get_job(job_id)
+            if job['status'] in ('completed', 'failed', 'cancelled'):
+                return job
+            time.sleep(poll_interval)
+
     def print_detections(self, result: Dict) -> None:
         """Pretty print detection results"""
         print(f"\n{'='*60}")
@@ -127,32 +231,63 @@ class YOLOAsyncClient:
     async def live_detection(
         self,
         on_detection: callable,
-        on_frame: Optional[callable] = None
+        on_frame: Optional[callable] = None,
+        binary: bool = False,
+        on_stats: Optional[callable] = None,
+        model: Optional[str] = None
     ):
         """
         Start live webcam detection via WebSocket
         
         Args:
             on_detection: Callback function(detections_dict) for each frame
-            on_frame: Optional callback function(image_base64) for video frames
+            on_frame: Optional callback for video frames. Receives the
+                "data:image/jpeg;base64,..." string in text mode, or the raw
+                JPEG bytes in binary mode
+            binary: Use the binary frame protocol (one message per frame, no base64)
+            on_stats: Optional callback for the periodic pacing reports
+                (measured fps, per-stage times, current resolution and JPEG quality)
+            model: Name of the server model to use (server default if None)
         """
         # Convert http to ws, https to wss
         ws_url = self.api_url.replace('http://', 'ws://').replace('https://', 'wss://')
+        subprotocols = [BINARY_SUBPROTOCOL] if binary else None
+        class_names = {}
         
         try:
-            async with websockets.connect(f"{ws_url}/ws/webcam") as ws:
+            query = f"?model={model}" if model else ""
+            async with websockets.connect(f"{ws_url}/ws/webcam{query}", subprotocols=subprotocols) as ws:
                 self.ws = ws
                 print("Connected to live stream")
                 
                 async for message in ws:
-                    if message.startswith('data:image'):
+                    if isinstance(message, bytes):
+                        # Binary frame: header, packed detections, raw JPEG
+                        seq, timestamp, detections, jpeg = decode_frame(message)
+                        objects = to_stream_objects(detections, class_names)
+                        if on_detection:
+                            on_detection({
+                                "type": "detections",
+                                "seq": seq,
+                                "timestamp": timestamp,
+                                "count": len(objects),
+                                "objects": objects
+                            })
+                        if on_frame:
+                            on_frame(jpeg)
+                    elif message.startswith('data:image'):
                         # Frame data
                         if on_frame:
                             on_frame(message)
                     else:
                         # Detection data
                         data = json.loads(message)
-                        if on_detection:
+                        if data.get('type') == 'hello':
+                            class_names = data.get('class_names', {})
+                        elif data.get('type') == 'pacing':
+                            if on_stats:
+                                on_stats(data)
+                        elif on_detection:
                             on_detection(data)
         
         except KeyboardInterrupt:
@@ -162,6 +297,61 @@ class YOLOAsyncClient:
         finally:
             self.ws = None
     
+    async def push_frames(
+        self,
+        frames,
+        on_detection: callable,
+        confidence: float = 0.5,
+        fps: float = 30.0,
+        model: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Send your own frames for detection via WebSocket
+
+        Frames are sent at `fps` regardless of how fast the server answers; the
+        server only ever works on the newest one and drops the rest.
+
+        Args:
+            frames: Iterable of encoded images (JPEG/PNG bytes)
+            on_detection: Callback function(detections_dict) for each processed
+                frame; "frame" is the index of the frame in `frames`
+            confidence: Detection confidence threshold (0.0-1.0)
+            fps: Rate at which frames are sent
+            model: Name of the server model to use (server default if None)
+
+        Returns:
+            The final stats message (received/dropped/processed counts)
+        """
+        ws_url = self.api_url.replace('http://', 'ws://').replace('https://', 'wss://')
+        stats = None
+
+        query = f"?confidence={confidence}" + (f"&model={model}" if model else "")
+        async with websockets.connect(f"{ws_url}/ws/detect{query}") as ws:
+            async def send():
+                for frame in frames:
+                    await ws.send(frame)
+                    await asyncio.sleep(1 / fps)
+                # The server answers the last frame, sends the final stats and closes;
+                # only close from this side if it doesn't within the timeout
+                await ws.send(json.dumps({"type": "end"}))
+                await asyncio.sleep(PUSH_END_TIMEOUT)
+                await ws.close()
+
+            sender = asyncio.create_task(send())
+            try:
+                async for message in ws:
+                    data = json.loads(message)
+                    if data.get('type') == 'stats':
+                        stats = data
+                    elif data.get('type') == 'detections' and on_detection:
+                        on_detection(data)
+            except websockets.ConnectionClosed:
+                pass
+            finally:
+                sender.cancel()
+
+        return stats
+
     async def stop_detection(self):
         """Stop live detection stream"""
         if self.ws:
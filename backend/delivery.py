@@ -0,0 +1,198 @@
+# delivery.py
+"""
+Serving result files: conditional GETs, byte ranges and proxy offload.
+
+Result files never change once written (a file id always names the same
+bytes), so validators are cheap and safe:
+
+- ETag and Last-Modified come from the file's mtime and size, in the same
+  format nginx uses for static files, so a client's cached copy validates
+  whether Python or nginx served it. A matching If-None-Match (or, without
+  one, an If-Modified-Since no older than the file) answers 304.
+- A single "Range: bytes=..." range answers 206 with just those bytes, which
+  is what video players send to seek. If-Range is honoured; several ranges in
+  one request get the whole file (200), which the spec allows. A range past
+  the end answers 416.
+- With an accel prefix, no bytes pass through Python at all: the response
+  carries only headers and an X-Accel-Redirect to an internal nginx location
+  that maps the prefix onto the results directory, and nginx does the
+  transfer (sendfile, ranges and conditionals included).
+"""
+
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi.responses import FileResponse, Response
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".mp4": "video/mp4",
+}
+
+
+def media_type_for(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix.lower(), "application/octet-stream")
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag in nginx's format: hex mtime and hex size"""
+    return f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def is_not_modified(headers: Mapping[str, str], stat_result: os.stat_result) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, file_etag(stat_result))
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single "bytes=" range, or None when the header
+    should be ignored (malformed, other unit, several ranges). Raises
+    ValueError when the range lies wholly past the end of the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None:
+        # Suffix range: the last `end` bytes
+        if end is None or end < 0:
+            return None
+        if end == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - end), size - 1
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range starts past the end of a {size} byte file")
+    if end is None:
+        end = size - 1
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(header: Optional[str], stat_result: os.stat_result) -> bool:
+    """Whether a Range may be honoured given If-Range (a strong ETag or a date)"""
+    if header is None:
+        return True
+    header = header.strip()
+    if header.startswith('"'):
+        return header == file_etag(stat_result)
+    try:
+        return int(stat_result.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that sends only bytes `start`..`end` (inclusive) as a 206"""
+
+    def __init__(self, path: Path, start: int, end: int, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            remaining = self.end - self.start + 1
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; end the body rather than hang the client
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def serve_file(
+    headers: Mapping[str, str],
+    path: Path,
+    filename: str,
+    cache_seconds: int = 0,
+    accel_prefix: str = "",
+) -> Response:
+    """
+    Response for downloading `path` given the request headers (see module
+    docstring). `accel_prefix` is the internal nginx location mapped onto the
+    file's directory; empty serves the bytes from Python.
+    """
+    stat_result = os.stat(path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    validators = {
+        "etag": file_etag(stat_result),
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": f"private, max-age={int(cache_seconds)}",
+    }
+    if is_not_modified(headers, stat_result):
+        return Response(status_code=304, headers=validators)
+
+    media_type = media_type_for(path)
+    if accel_prefix:
+        response = Response(media_type=media_type, headers={
+            "x-accel-redirect": accel_prefix.rstrip("/") + "/" + quote(path.name),
+            "cache-control": validators["cache-control"],
+        })
+        response.headers["content-disposition"] = f'attachment; filename="{filename}"'
+        # The body comes from nginx; don't announce a length for the empty one here
+        del response.headers["content-length"]
+        return response
+
+    headers_out = {**validators, "accept-ranges": "bytes"}
+    range_header = headers.get("range")
+    if range_header and _if_range_matches(headers.get("if-range"), stat_result):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{stat_result.st_size}", "accept-ranges": "bytes"},
+            )
+        if byte_range is not None:
+            return RangeFileResponse(
+                path, *byte_range, stat_result=stat_result,
+                media_type=media_type, filename=filename, headers=headers_out,
+            )
+    return FileResponse(
+        path, stat_result=stat_result, media_type=media_type, filename=filename, headers=headers_out,
+    )
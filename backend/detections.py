@@ -0,0 +1,108 @@
+# detections.py
+"""
+Bulk detection extraction and response formats.
+
+Boxes are pulled out of an ultralytics Results object with a single
+tensor-to-NumPy conversion instead of per-box tensor indexing, then
+rendered either as the classic per-object JSON or as a compact columnar
+payload (parallel arrays plus the class names used, sent once).
+"""
+
+from typing import Dict, List, Mapping
+
+import numpy as np
+
+FORMAT_OBJECTS = "objects"
+FORMAT_COLUMNAR = "columnar"
+FORMATS = (FORMAT_OBJECTS, FORMAT_COLUMNAR)
+
+
+class DetectionArrays:
+    """Detections for one image as parallel NumPy arrays"""
+
+    __slots__ = ("xyxy", "conf", "cls")
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy = xyxy  # (N, 4) float32
+        self.conf = conf  # (N,) float32
+        self.cls = cls    # (N,) int64
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+
+def extract(result) -> DetectionArrays:
+    """Convert a Results object's boxes to NumPy in one shot"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return DetectionArrays(
+            np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+        )
+    # Columns are x1, y1, x2, y2, [track_id,] conf, cls
+    data = boxes.data.cpu().numpy()
+    return DetectionArrays(data[:, :4], data[:, -2], data[:, -1].astype(np.int64))
+
+
+def to_rows(det: DetectionArrays) -> np.ndarray:
+    """Pack detections as (N, 6) float32 rows of x1, y1, x2, y2, conf, cls (the Boxes layout)"""
+    return np.concatenate(
+        [det.xyxy, det.conf[:, None], det.cls[:, None].astype(np.float32)], axis=1
+    ).astype(np.float32, copy=False)
+
+
+def to_results(image: np.ndarray, rows: np.ndarray, names: Mapping[int, str]):
+    """Rebuild an ultralytics Results object from (N, 6) detection rows, e.g. for plotting"""
+    import torch
+    from ultralytics.engine.results import Results
+
+    return Results(orig_img=image, path="", names=names, boxes=torch.from_numpy(rows))
+
+
+def carry_over(result, image: np.ndarray):
+    """A previous frame's detections as a Results object for a new frame (inference skipped)"""
+    return to_results(image, to_rows(extract(result)), result.names)
+
+
+def to_columnar(det: DetectionArrays, names: Mapping[int, str]) -> Dict:
+    """
+    Compact payload: ``class_ids``, ``scores`` and a flat ``boxes`` array
+    (x1, y1, x2, y2 per detection), with names only for the classes present.
+    """
+    class_ids = det.cls.tolist()
+    return {
+        "format": FORMAT_COLUMNAR,
+        "count": len(class_ids),
+        "class_ids": class_ids,
+        "scores": det.conf.tolist(),
+        "boxes": det.xyxy.reshape(-1).tolist(),
+        "class_names": {str(c): names[c] for c in sorted(set(class_ids))},
+    }
+
+
+def columnar_to_objects(columnar: Dict) -> List[Dict]:
+    """Expand a columnar payload into the per-object format used by /detect/image"""
+    names = columnar["class_names"]
+    boxes = columnar["boxes"]
+    objects = []
+    for i, (class_id, score) in enumerate(zip(columnar["class_ids"], columnar["scores"])):
+        x1, y1, x2, y2 = boxes[4 * i:4 * i + 4]
+        objects.append({
+            "class_id": class_id,
+            "class_name": names[str(class_id)],
+            "confidence": score,
+            "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+        })
+    return objects
+
+
+def to_objects(det: DetectionArrays, names: Mapping[int, str]) -> List[Dict]:
+    """Per-object format used by /detect/image"""
+    return columnar_to_objects(to_columnar(det, names))
+
+
+def to_stream_objects(det: DetectionArrays, names: Mapping[int, str]) -> List[Dict]:
+    """Per-object format used by the live webcam stream"""
+    return [
+        {"class": names[class_id], "confidence": score, "bbox": box}
+        for class_id, score, box in zip(det.cls.tolist(), det.conf.tolist(), det.xyxy.tolist())
+    ]
@@ -0,0 +1,144 @@
+# executor.py
+"""
+Bounded worker pool for blocking inference work (decode, model, plot, encode).
+Keeps the asyncio event loop free and rejects work quickly once the queue is full.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is full; carries a Retry-After hint in seconds"""
+
+    def __init__(self, retry_after: int, depth: int):
+        super().__init__(f"Inference queue full ({depth} pending), retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.depth = depth
+
+
+class InferenceExecutor:
+    """
+    Thread pool with a bounded backlog.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may wait.
+    Anything beyond that raises QueueFullError immediately instead of piling up.
+
+    A slot can also be reserved ahead of time (`reserve`) and later used by
+    `run(..., reserved=True)` or handed back (`unreserve`). The micro-batcher
+    reserves one per caller when it admits the caller, so a batch that has
+    been formed always runs and is never rejected as a whole.
+
+    Args:
+        max_workers: Number of worker threads
+        max_queue: Jobs allowed to wait for a free worker
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running
+        self._running = 0
+        self.submitted = 0
+        self.rejected = 0
+        # Exponential moving averages, in seconds
+        self._avg_wait = 0.0
+        self._avg_service = 0.0
+        self._last_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker (not counting the ones running)"""
+        with self._lock:
+            return self._pending - self._running
+
+    @property
+    def saturated(self) -> bool:
+        with self._lock:
+            return self._pending >= self.max_workers + self.max_queue
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up, based on recent service times"""
+        with self._lock:
+            backlog = max(1, self._pending - self.max_workers + 1)
+            estimate = self._avg_service * backlog / self.max_workers
+        return max(1, math.ceil(estimate))
+
+    def reserve(self):
+        """Take a queue slot now, or raise QueueFullError; use it with run(reserved=True) or unreserve it"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                depth = self._pending - self._running
+                full = True
+            else:
+                self._pending += 1
+                self.submitted += 1
+                full = False
+        if full:
+            raise QueueFullError(self.retry_after(), depth)
+
+    def unreserve(self):
+        """Give back a slot taken with `reserve` that won't be used"""
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, reserved: bool = False) -> Any:
+        """
+        Run fn(*args) on the pool and await its result, or raise QueueFullError.
+        With `reserved`, the slot taken earlier by `reserve` is used and admission can't fail.
+        """
+        if not reserved:
+            self.reserve()
+
+        enqueued = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            with self._lock:
+                self._running += 1
+                self._last_wait = started - enqueued
+                self._avg_wait = 0.9 * self._avg_wait + 0.1 * self._last_wait
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    service = time.monotonic() - started
+                    self._avg_service = 0.9 * self._avg_service + 0.1 * service
+
+        try:
+            future = self._pool.submit(job)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """Queue depth and wait times, for /health and load balancer probes"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._pending - self._running,
+                "saturated": self._pending >= self.max_workers + self.max_queue,
+                "last_wait_ms": round(self._last_wait * 1000.0, 2),
+                "avg_wait_ms": round(self._avg_wait * 1000.0, 2),
+                "avg_service_ms": round(self._avg_service * 1000.0, 2),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
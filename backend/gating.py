@@ -0,0 +1,75 @@
+# gating.py
+"""
+Motion / scene-change gating in front of the model.
+
+Each frame is reduced to a small grayscale thumbnail and compared with the
+thumbnail of the last frame that was actually run through the model (mean
+absolute difference, 0..1). Below the threshold the scene is considered
+unchanged and the caller reuses the previous detections instead of running
+inference. Comparing against the last *inferred* frame (not the previous
+frame) means slow drift still triggers inference once it adds up.
+"""
+
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+THUMBNAIL_WIDTH = 64
+
+
+class MotionGate:
+    """
+    Per-stream gate. `check(frame)` returns True when the model should run.
+    The caller keeps whatever it needs to reuse in `last` (e.g. the last Results).
+    """
+
+    def __init__(self, threshold: float, max_skip: int = 30):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.last: Any = None
+        self.checked = 0
+        self.skipped = 0
+        self._reference = None
+        self._run = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    @staticmethod
+    def _thumbnail(frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height = max(1, round(gray.shape[0] * THUMBNAIL_WIDTH / gray.shape[1]))
+        return cv2.resize(gray, (THUMBNAIL_WIDTH, height), interpolation=cv2.INTER_AREA)
+
+    def change(self, frame: np.ndarray) -> float:
+        """Mean absolute difference from the reference frame, 0 (same) to 1"""
+        if self._reference is None:
+            return 1.0
+        thumb = self._thumbnail(frame)
+        if thumb.shape != self._reference.shape:
+            return 1.0
+        return float(cv2.absdiff(thumb, self._reference).mean()) / 255.0
+
+    def check(self, frame: np.ndarray) -> bool:
+        """Decide whether to run the model on this frame; a True answer makes it the new reference"""
+        self.checked += 1
+        if (
+            self.enabled
+            and self._run < self.max_skip
+            and self.change(frame) < self.threshold
+        ):
+            self.skipped += 1
+            self._run += 1
+            return False
+        self._reference = self._thumbnail(frame)
+        self._run = 0
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "motion_threshold": self.threshold,
+            "frames_checked": self.checked,
+            "frames_skipped": self.skipped,
+        }
@@ -0,0 +1,76 @@
+# ingest.py
+"""
+Latest-frame-wins buffering for client-pushed video frames.
+
+Each connection gets a single slot. A frame arriving while the previous one
+is still waiting replaces it (and counts as dropped), so when inference is
+slower than the camera the server always works on the newest frame and
+latency stays bounded instead of growing with a queue.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class LatestFrameSlot:
+    """One-slot buffer for a single connection; `get` waits for the next fresh frame"""
+
+    def __init__(self):
+        self._item: Any = None
+        self._index = -1
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def put(self, item: Any) -> bool:
+        """Store a frame, replacing (and dropping) any frame not yet taken; True if one was dropped"""
+        replaced = self._item is not None
+        if replaced:
+            self.dropped += 1
+        self._item = item
+        self._index = self.received
+        self.received += 1
+        self._event.set()
+        return replaced
+
+    def drop_taken(self):
+        """Count a frame that was taken but could not be processed (e.g. server overloaded)"""
+        self.dropped += 1
+
+    async def get(self) -> Optional[tuple]:
+        """Wait for the newest frame and return (frame_index, frame), or None once closed"""
+        while self._item is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, index = self._item, self._index
+        self._item = None
+        return index, item
+
+    def end(self):
+        """No more frames are coming: a waiting frame is still handed out, then `get` returns None"""
+        self._closed = True
+        self._event.set()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Wake the consumer; frames still in the slot are dropped"""
+        if self._item is not None:
+            self.dropped += 1
+            self._item = None
+        self._closed = True
+        self._event.set()
+
+    def stats(self) -> Dict:
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "pending": 0 if self._item is None else 1,
+        }
@@ -0,0 +1,207 @@
+# jobs.py
+"""
+Background job manager for long-running video detection.
+
+Submitting returns a job id immediately; the work runs on a small,
+bounded thread pool and reports progress that clients can poll or
+stream (Server-Sent Events) until the job finishes.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from executor import QueueFullError
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """State of one background job; progress fields are written from the worker thread"""
+
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = QUEUED
+        self.created_at = datetime.now()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.frames_processed = 0
+        self.frames_total = 0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.version = 0  # bumped on every change so streams know when to emit
+
+    def update_progress(self, processed: int, total: int):
+        self.frames_processed = processed
+        self.frames_total = total
+        self.version += 1
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict:
+        elapsed = None
+        fps = None
+        eta = None
+        if self.started is not None:
+            elapsed = (self.finished or time.monotonic()) - self.started
+            if elapsed > 0 and self.frames_processed:
+                fps = self.frames_processed / elapsed
+                if self.status == RUNNING and self.frames_total:
+                    eta = max(0, self.frames_total - self.frames_processed) / fps
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "frames_processed": self.frames_processed,
+            "frames_total": self.frames_total,
+            "progress": (
+                min(1.0, self.frames_processed / self.frames_total)
+                if self.frames_total else (1.0 if self.status == COMPLETED else 0.0)
+            ),
+            "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+            "fps": round(fps, 2) if fps is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Run at most `max_concurrent` jobs at once with at most `max_pending` waiting.
+
+    Args:
+        max_concurrent: Jobs processed in parallel on this node
+        max_pending: Jobs allowed to wait for a slot before submits are rejected
+        max_retained: Finished jobs kept for status lookups (oldest dropped first)
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 16, max_retained: int = 200):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_pending = max(0, int(max_pending))
+        self.max_retained = max(1, int(max_retained))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active = 0
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        kind: str,
+        work: Callable[[Job], Dict],
+        on_finish: Optional[Callable[[Job], Any]] = None,
+    ) -> Job:
+        """
+        Queue `work(job)` (blocking, returns the result dict) and return the job at once.
+        `on_finish(job)` runs on the event loop after the job ends, whatever the outcome.
+        """
+        if self._active >= self.max_concurrent + self.max_pending:
+            raise QueueFullError(retry_after=30, depth=self._active - self.max_concurrent)
+        job = Job(kind)
+        self._jobs[job.id] = job
+        self._active += 1
+        self._prune()
+        asyncio.get_running_loop().create_task(self._run(job, work, on_finish))
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_event.set()
+        if job.status == QUEUED:
+            # Never started: finish it now; _run will see the flag and skip the work
+            job.status = CANCELLED
+            job.version += 1
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Dict], on_finish):
+        loop = asyncio.get_running_loop()
+
+        def run():
+            if job.cancel_event.is_set():
+                return None
+            job.status = RUNNING
+            job.started = time.monotonic()
+            job.version += 1
+            return work(job)
+
+        try:
+            job.result = await loop.run_in_executor(self._pool, run)
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+            else:
+                job.status = COMPLETED
+        except Exception as e:
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+            else:
+                job.status = FAILED
+                job.error = str(e)
+        finally:
+            job.finished = time.monotonic()
+            self._active -= 1
+            job.version += 1
+            if on_finish is not None:
+                try:
+                    on_finish(job)
+                except Exception as e:
+                    print(f"Job {job.id} cleanup error: {e}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs once more than max_retained are stored"""
+        excess = len(self._jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.done][:excess]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        running = sum(1 for j in self._jobs.values() if j.status == RUNNING)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_pending": self.max_pending,
+            "running": running,
+            "queued": max(0, self._active - running),
+        }
+
+    async def events(self, job: Job, interval: float = 0.5, keepalive: float = 15.0):
+        """Yield Server-Sent Events with the job state whenever it changes, until it finishes"""
+        last_version = -1
+        last_sent = time.monotonic()
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                last_sent = time.monotonic()
+                event = "done" if job.done else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.done:
+                    return
+            elif time.monotonic() - last_sent >= keepalive:
+                # Comment line so idle proxies don't drop the stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(interval)
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            job.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
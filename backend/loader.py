@@ -0,0 +1,236 @@
+# loader.py
+"""
+Model loading shared by the API process and the model worker processes.
+
+torch and ultralytics take seconds to import, so this module doesn't import
+them: `import_backend()` does, on first load, and applies the patches below.
+That keeps the API importable (and answering probes) while the model loads.
+
+Besides PyTorch eager mode, the checkpoint can be served through an exported
+engine (TorchScript, ONNX Runtime or OpenVINO). Exports are written next to
+the weights by the ultralytics exporter, with a ``<artifact>.source`` stamp
+holding the SHA-256 of the weights they came from; a stale or missing stamp
+triggers a fresh export. PyTorch weights get the same treatment: a fused
+float32 copy (``<stem>.fused.pt``) is saved once and loaded from then on,
+so startup skips the half-to-float conversion and layer fusion.
+
+Every engine runs the same weights, so detections match the PyTorch path:
+ONNX and OpenVINO are exported with dynamic axes and take the caller's
+imgsz like PyTorch does; TorchScript graphs are static and always run at
+EXPORT_IMGSZ. One difference is inherent to ultralytics: exported engines
+letterbox to a square, where PyTorch pads a single image only to the next
+stride multiple. Boxes are mapped back to the image either way, but the extra
+grey border can move scores and box edges by float-rounding amounts, so
+compare engines with a tolerance rather than for exact equality.
+"""
+
+import functools
+import itertools
+import platform
+import shutil
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+
+import numpy as np
+
+from cache import model_fingerprint
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+_backend_imported = False
+
+
+def import_backend() -> float:
+    """
+    Import torch and ultralytics and patch them (once per process).
+    Returns the seconds spent, 0 if they were already imported.
+    """
+    global _backend_imported
+    if _backend_imported:
+        return 0.0
+    start = time.perf_counter()
+    import torch
+    import ultralytics.nn.tasks as ultralytics_tasks
+    import ultralytics.utils.torch_utils as ultralytics_torch_utils
+
+    # Monkeypatch ultralytics torch_safe_load to disable weights_only=True
+    # This avoids the need to allowlist dozens of custom classes in PyTorch 2.6+
+    def torch_safe_load_patched(file):
+        """Load checkpoint without weights_only restriction (trusted source)."""
+        return torch.load(file, map_location='cpu', weights_only=False), file
+
+    ultralytics_tasks.torch_safe_load = torch_safe_load_patched
+
+    # select_device runs py-cpuinfo in a subprocess (~1 s) on the first predict just
+    # to print the CPU name in a log line
+    ultralytics_torch_utils.get_cpu_info = functools.lru_cache(None)(
+        lambda: platform.processor() or platform.machine()
+    )
+
+    _backend_imported = True
+    return time.perf_counter() - start
+
+
+def load_yolo(path: Union[str, Path]) -> "YOLO":
+    """Load a YOLO model from a checkpoint path"""
+    import_backend()
+    from ultralytics import YOLO
+
+    return YOLO(str(path))
+
+
+ENGINE_PYTORCH = "pytorch"
+ENGINE_TORCHSCRIPT = "torchscript"
+ENGINE_ONNX = "onnx"
+ENGINE_OPENVINO = "openvino"
+
+# Engine -> (ultralytics export format, suffix of the exported artifact next to the weights)
+EXPORT_FORMATS = {
+    ENGINE_TORCHSCRIPT: ("torchscript", ".torchscript"),
+    ENGINE_ONNX: ("onnx", ".onnx"),
+    ENGINE_OPENVINO: ("openvino", "_openvino_model"),
+}
+ENGINES = (ENGINE_PYTORCH,) + tuple(EXPORT_FORMATS)
+
+# Suffix of the fused float32 copy of a PyTorch checkpoint (see ensure_fastload)
+FASTLOAD_SUFFIX = ".fused.pt"
+
+# Size exports are built at; static graphs (TorchScript) only take this square input
+EXPORT_IMGSZ = 640
+# Exported with dynamic batch and image axes, so they accept any imgsz (a multiple of the stride)
+DYNAMIC_ENGINES = (ENGINE_ONNX, ENGINE_OPENVINO)
+
+
+def check_engine(engine: str):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine '{engine}', expected one of {list(ENGINES)}")
+
+
+def supports_imgsz(engine: str) -> bool:
+    """Whether the inference size can change per call"""
+    return engine == ENGINE_PYTORCH or engine in DYNAMIC_ENGINES
+
+
+def artifact_path(weights: Union[str, Path], engine: str) -> Path:
+    """Where the exporter puts the artifact for `engine` (e.g. weights/final.onnx)"""
+    weights = Path(weights)
+    _, suffix = EXPORT_FORMATS[engine]
+    return weights.with_name(weights.stem + suffix)
+
+
+def _stamp_matches(artifact: Path, fingerprint: str) -> bool:
+    stamp = artifact.with_name(artifact.name + ".source")
+    return artifact.exists() and stamp.exists() and stamp.read_text().strip() == fingerprint
+
+
+def ensure_fastload(weights: Union[str, Path]) -> Path:
+    """
+    Return the fused float32 copy of a PyTorch checkpoint, writing it first if
+    missing or stale. Falls back to the checkpoint itself if it can't be written.
+    """
+    weights = Path(weights)
+    artifact = weights.with_name(weights.stem + FASTLOAD_SUFFIX)
+    stamp = artifact.with_name(artifact.name + ".source")
+    fingerprint = model_fingerprint(weights)
+    if _stamp_matches(artifact, fingerprint):
+        return artifact
+
+    import_backend()
+    import torch
+
+    model = load_yolo(weights)
+    # What AutoBackend would otherwise do on every start
+    detection_model = model.model.float().fuse(verbose=False).eval()
+    ckpt = {"model": detection_model, "train_args": model.ckpt.get("train_args", {})}
+    tmp = artifact.with_name(artifact.name + ".tmp")
+    try:
+        stamp.unlink(missing_ok=True)
+        torch.save(ckpt, tmp)
+        tmp.replace(artifact)
+        stamp.write_text(fingerprint)
+    except OSError as e:
+        print(f"Could not write fast-load copy of {weights}: {e}")
+        tmp.unlink(missing_ok=True)
+        return weights
+    return artifact
+
+
+def ensure_export(weights: Union[str, Path], engine: str) -> Path:
+    """Return the exported artifact for `engine`, exporting it first if missing or stale"""
+    check_engine(engine)
+    weights = Path(weights)
+    artifact = artifact_path(weights, engine)
+    stamp = artifact.with_name(artifact.name + ".source")
+    fingerprint = model_fingerprint(weights)
+    if _stamp_matches(artifact, fingerprint):
+        return artifact
+
+    stamp.unlink(missing_ok=True)
+    fmt, _ = EXPORT_FORMATS[engine]
+    # Dynamic batch so batched requests and video frames go through in one call, and
+    # dynamic height/width so a caller's imgsz is honoured as with PyTorch
+    options = {"dynamic": True} if engine in DYNAMIC_ENGINES else {}
+    exported = Path(load_yolo(weights).export(format=fmt, imgsz=EXPORT_IMGSZ, **options))
+    if exported.resolve() != artifact.resolve():
+        if artifact.is_dir():
+            shutil.rmtree(artifact)
+        shutil.move(str(exported), str(artifact))
+    stamp.write_text(fingerprint)
+    return artifact
+
+
+@functools.lru_cache(None)
+def _exported_yolo_class():
+    import_backend()
+    from ultralytics import YOLO
+
+    class ExportedYOLO(YOLO):
+        """YOLO over an exported artifact; class names come from the export's metadata"""
+
+        @property
+        def names(self):
+            # The backend (and its metadata) is only loaded when the predictor is set up
+            if self.predictor is None:
+                warmup(self, runs=1)
+            return self.predictor.model.names
+
+    return ExportedYOLO
+
+
+def load_model(weights: Union[str, Path], engine: str = ENGINE_PYTORCH) -> "YOLO":
+    """Load the checkpoint through the given engine (exporting it on first use)"""
+    check_engine(engine)
+    if engine == ENGINE_PYTORCH:
+        return load_yolo(ensure_fastload(weights))
+    return _exported_yolo_class()(str(ensure_export(weights, engine)), task="detect")
+
+
+def warmup(model: "YOLO", runs: int = 2) -> float:
+    """
+    Run a few dummy frames so lazy backend setup, kernel selection and allocator
+    growth happen before the first request. Returns the time taken in ms.
+    """
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    for _ in range(runs):
+        model(frame, verbose=False)
+    return (time.perf_counter() - start) * 1000
+
+
+def model_nbytes(model: "YOLO") -> int:
+    """
+    Estimated memory held by a loaded model: parameter and buffer bytes for
+    PyTorch, the size of the exported artifact for other engines.
+    """
+    import torch
+
+    inner = getattr(model, "model", None)
+    if isinstance(inner, torch.nn.Module):
+        tensors = itertools.chain(inner.parameters(), inner.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    path = Path(str(inner))
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return path.stat().st_size if path.exists() else 0
@@ -0,0 +1,276 @@
+# metrics.py
+"""
+Prometheus metrics for the detection hot path, without a client library.
+
+Counters, gauges and histograms are kept in plain dicts keyed by label
+values and rendered in the Prometheus text format on scrape. Recording is a
+dict lookup, a bisect over the bucket bounds and a few additions under a
+per-metric lock (about a microsecond), so the instrumentation can stay on
+in production; the stages it times take milliseconds.
+
+Gauges and counters may instead be given a callback that is read at scrape
+time, for values another component already tracks (queue depth, rejected
+jobs), so the hot path doesn't pay for them at all.
+
+The metrics the API records are defined at the bottom of this module.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Starlette appends "; charset=utf-8" to text/* types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds: sub-millisecond stages (box extraction) up to whole videos
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable] = None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # fn() -> value, or {label values tuple: value} for labelled metrics
+        self.fn = fn
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def _samples(self) -> List[Tuple[Tuple, float]]:
+        if self.fn is not None:
+            value = self.fn()
+            return list(value.items()) if isinstance(value, dict) else [((), value)]
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, *labels: str):
+        self.inc(-amount, *labels)
+
+
+class _Timer:
+    """Context manager recording its duration into a histogram"""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels: str) -> _Timer:
+        """``with histogram.time(*labels):`` observes the block's duration in seconds"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = [(labels, list(buckets), total, count) for labels, (buckets, total, count) in self._series.items()]
+        for labels, buckets, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (float("inf"),), buckets):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable] = None) -> Counter:
+        return self.register(Counter(name, help, labels, fn))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable] = None) -> Gauge:
+        return self.register(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken callback must not take down the whole scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "yolo_stage_seconds",
+    "Time spent in each stage of a detection path (upload, decode, model, extract, plot, encode, serialize, ...)",
+    ("path", "stage"),
+)
+MODEL_SECONDS = REGISTRY.histogram(
+    "yolo_model_seconds",
+    "Model call stages: lock_wait and forward per call; preprocess, inference and postprocess per image",
+    ("model", "stage"),
+)
+MODEL_BATCH_SIZE = REGISTRY.histogram(
+    "yolo_model_batch_size", "Images per model call", ("model",), buckets=BATCH_BUCKETS,
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "yolo_http_request_seconds", "HTTP request latency, until the last body byte is sent", ("endpoint",),
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS_TOTAL = REGISTRY.counter(
+    "yolo_http_requests_total", "HTTP requests handled", ("endpoint", "method", "status"),
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("yolo_http_requests_in_flight", "HTTP requests being handled")
+WEBSOCKETS_OPEN = REGISTRY.gauge("yolo_websocket_connections", "Open WebSocket connections")
+FRAMES_TOTAL = REGISTRY.counter(
+    "yolo_frames_total", "Frames run through detection (or motion-gated) per source", ("source",),
+)
+FRAMES_DROPPED = REGISTRY.counter(
+    "yolo_frames_dropped_total", "Frames dropped instead of processed or delivered", ("source", "reason"),
+)
+IMAGES_TOTAL = REGISTRY.counter(
+    "yolo_images_total", "Images detected on per path (cache hits included)", ("path", "cached"),
+)
+
+
+def observe_model_call(model: str, results, forward_s: float, lock_wait_s: float, batch_size: int):
+    """Record one model call; Results carry ultralytics' per-image stage times in ms"""
+    MODEL_SECONDS.observe(forward_s, model, "forward")
+    MODEL_SECONDS.observe(lock_wait_s, model, "lock_wait")
+    MODEL_BATCH_SIZE.observe(batch_size, model)
+    speed = getattr(results[0], "speed", None) if results else None
+    if not speed:
+        return
+    for stage in ("preprocess", "inference", "postprocess"):
+        ms = speed.get(stage)
+        if ms is not None:
+            MODEL_SECONDS.observe(ms / 1000.0, model, stage)
+
+
+def _endpoint_label(scope) -> str:
+    """Route template ("/download/{file_id}"), so labels don't grow with path parameters"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests per endpoint and status, their latency (to
+    the last body byte, so streamed responses count in full) and how many are in
+    flight. Open WebSocket connections are tracked as a gauge.
+    """
+
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            WEBSOCKETS_OPEN.inc()
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                WEBSOCKETS_OPEN.dec()
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope
+            endpoint = _endpoint_label(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+            REQUESTS_TOTAL.inc(1, endpoint, scope["method"], str(status))
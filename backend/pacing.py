@@ -0,0 +1,144 @@
+# pacing.py
+"""
+Adaptive pacing for live detection streams.
+
+Instead of sleeping a fixed 30 ms after every frame, each connection gets a
+controller that measures how long capture/inference, encoding and sending
+actually take and:
+
+- sleeps only for what is left of the frame budget (1 / target fps, or the
+  latency budget if that is tighter), so fast nodes reach the target rate and
+  slow ones stop adding idle time on top of slow inference;
+- walks a quality ladder of (inference size, JPEG quality) steps: one step
+  down when frames keep overrunning the budget or the node reports overload,
+  one step up again when there is comfortable headroom.
+
+Moves are rate-limited (hysteresis) so the stream doesn't oscillate.
+"""
+
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+# (inference image size, JPEG quality), best first
+DEFAULT_LADDER: Tuple[Tuple[int, int], ...] = (
+    (640, 80),
+    (640, 70),
+    (512, 60),
+    (416, 50),
+    (320, 40),
+)
+DEFAULT_LEVEL = 1  # 640 px / quality 70, the previous fixed settings
+
+STAGES = ("capture", "inference", "encode", "send")
+
+
+class AdaptivePacer:
+    """Per-connection frame pacing and quality controller"""
+
+    def __init__(
+        self,
+        target_fps: float = 30.0,
+        latency_budget_ms: Optional[float] = None,
+        ladder: Sequence[Tuple[int, int]] = DEFAULT_LADDER,
+        level: int = DEFAULT_LEVEL,
+        alpha: float = 0.2,
+        degrade_after: int = 5,
+        upgrade_after: int = 30,
+    ):
+        self.target_fps = max(0.1, target_fps)
+        self.latency_budget_ms = latency_budget_ms
+        self.ladder = tuple(ladder)
+        self.level = min(max(0, level), len(self.ladder) - 1)
+        self.alpha = alpha
+        self.degrade_after = degrade_after
+        self.upgrade_after = upgrade_after
+
+        self.stage_ms: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.work_ms = 0.0
+        self.frames = 0
+        self.dropped = 0
+        self._over = 0
+        self._under = 0
+        self._frame_start: Optional[float] = None
+        self._last_frame_end: Optional[float] = None
+        self._fps = 0.0
+
+    @property
+    def budget_s(self) -> float:
+        """Time available per frame"""
+        budget = 1.0 / self.target_fps
+        if self.latency_budget_ms is not None:
+            budget = min(budget, self.latency_budget_ms / 1000)
+        return budget
+
+    @property
+    def imgsz(self) -> int:
+        return self.ladder[self.level][0]
+
+    @property
+    def jpeg_quality(self) -> int:
+        return self.ladder[self.level][1]
+
+    def start_frame(self):
+        self._frame_start = time.perf_counter()
+
+    def _ema(self, old: float, new: float) -> float:
+        return new if self.frames == 0 else old + self.alpha * (new - old)
+
+    def end_frame(self, timings: Dict[str, float]) -> float:
+        """
+        Record one delivered frame's stage timings (seconds) and adapt.
+        Returns how long to sleep before starting the next frame.
+        """
+        now = time.perf_counter()
+        work = now - (self._frame_start or now)
+        for stage in STAGES:
+            if stage in timings:
+                self.stage_ms[stage] = self._ema(self.stage_ms[stage], timings[stage] * 1000)
+        self.work_ms = self._ema(self.work_ms, work * 1000)
+        if self._last_frame_end is not None:
+            interval = now - self._last_frame_end
+            if interval > 0:
+                self._fps = self._ema(self._fps, 1.0 / interval) if self._fps else 1.0 / interval
+        self._last_frame_end = now
+        self.frames += 1
+
+        budget_ms = self.budget_s * 1000
+        if self.work_ms > budget_ms:
+            self._over += 1
+            self._under = 0
+        elif self.work_ms < 0.6 * budget_ms:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.degrade_after:
+            self._step(+1)
+        elif self._under >= self.upgrade_after:
+            self._step(-1)
+
+        return max(0.0, self.budget_s - work)
+
+    def overloaded(self):
+        """The node refused the frame: count it as dropped and degrade right away"""
+        self.dropped += 1
+        self._step(+1)
+
+    def _step(self, direction: int):
+        self.level = min(max(0, self.level + direction), len(self.ladder) - 1)
+        self._over = self._under = 0
+
+    def stats(self) -> Dict:
+        return {
+            "target_fps": self.target_fps,
+            "latency_budget_ms": self.latency_budget_ms,
+            "fps": round(self._fps, 2),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "level": self.level,
+            "imgsz": self.imgsz,
+            "jpeg_quality": self.jpeg_quality,
+            "frame_ms": round(self.work_ms, 2),
+            "stage_ms": {stage: round(ms, 2) for stage, ms in self.stage_ms.items()},
+        }
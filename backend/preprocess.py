@@ -0,0 +1,208 @@
+# preprocess.py
+"""
+Decoding uploads straight to the model input size.
+
+A 12 MP JPEG decoded at full resolution is a 36 MB array that the model
+immediately letterboxes down to 640 px. For requests that only need the
+detections, this module skips most of that work:
+
+- JPEG dimensions are read from the frame header, and when the image is at
+  least twice the model input size it is decoded with IMREAD_REDUCED_COLOR_2/4/8.
+  libjpeg then scales in the DCT, so the decode is several times faster
+  and the full-size array is never allocated.
+- The (reduced) image is resized once, keeping its aspect ratio, into a
+  size x size buffer taken from a pool and reused across requests. The model
+  gets a view of exactly its letterboxed size, so its own letterbox only
+  pads and doesn't resize a second time.
+- Boxes found on that view are scaled back to the original image's
+  coordinates (after EXIF rotation, which the decode applies).
+
+Anything that isn't a JPEG (PNG, WebP, ...) is decoded at full size and
+then goes through the same single resize.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import DetectionArrays
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Start-of-frame markers carrying the image size (every SOFn except DHT, JPG and DAC)
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+
+def jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG's frame header, or None if `data` isn't a JPEG"""
+    view = memoryview(data).cast("B")
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    pos = 2
+    end = len(view)
+    while pos + 4 <= end:
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in _STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+        length = (view[pos + 2] << 8) | view[pos + 3]
+        if marker in _SOF_MARKERS:
+            if pos + 9 > end:
+                return None
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return (width, height) if width and height else None
+        pos += 2 + length
+    return None
+
+
+def reduction_factor(width: int, height: int, size: int) -> int:
+    """Largest JPEG scale-down (8, 4 or 2) that keeps the longest side at least `size`, else 1"""
+    longest = max(width, height)
+    for factor, _ in REDUCED_FLAGS:
+        if -(-longest // factor) >= size:
+            return factor
+    return 1
+
+
+def decode_reduced(data, size: int) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    """
+    Decode `data` at the smallest resolution still at least `size` on its
+    longest side. Returns (image, (original_width, original_height)); the
+    image is None if the bytes aren't a decodable image.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    if buf.size == 0:
+        return None, (0, 0)
+    dims = jpeg_size(buf)
+    factor = reduction_factor(*dims, size) if dims else 1
+    flag = dict(REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+    image = cv2.imdecode(buf, flag)
+    if image is None:
+        return None, (0, 0)
+    height, width = image.shape[:2]
+    if factor == 1:
+        return image, (width, height)
+    original_width, original_height = dims
+    if (width, height) != (-(-original_width // factor), -(-original_height // factor)):
+        # EXIF orientation rotated the decoded image by 90 degrees
+        original_width, original_height = original_height, original_width
+    return image, (original_width, original_height)
+
+
+def letterbox_into(image: np.ndarray, buffer: np.ndarray, size: int) -> np.ndarray:
+    """
+    Resize `image` so its longest side is `size` (aspect ratio kept, same
+    rounding as ultralytics' LetterBox) into the top-left corner of `buffer`.
+    Returns the view holding the result; the image itself if it already fits exactly.
+    """
+    height, width = image.shape[:2]
+    r = min(size / height, size / width)
+    new_width, new_height = int(round(width * r)), int(round(height * r))
+    if (new_width, new_height) == (width, height):
+        return image
+    view = buffer[:new_height, :new_width]
+    cv2.resize(image, (new_width, new_height), dst=view, interpolation=cv2.INTER_LINEAR)
+    return view
+
+
+class FramePool:
+    """
+    Free list of size x size BGR buffers. `acquire` hands out a free one or
+    allocates; `release` keeps up to `max_free` for reuse. A buffer that is
+    never released is simply garbage collected.
+    """
+
+    def __init__(self, size: int, max_free: int = 16):
+        self.size = size
+        self.max_free = max_free
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self) -> np.ndarray:
+        with self._lock:
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.allocated += 1
+        return np.empty((self.size, self.size, 3), np.uint8)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            free = len(self._free)
+        return {"size": self.size, "free": free, "allocated": self.allocated, "reused": self.reused}
+
+
+class Letterbox:
+    """
+    A decoded upload resized to the model input: `image` (a view into a
+    pooled buffer) plus what is needed to map detections back to the
+    original `width` x `height`. Call `release` once the model is done with it
+    (`to_original` still works afterwards; it only uses the sizes). `release`
+    may be called more than once.
+    """
+
+    __slots__ = ("image", "width", "height", "_buffer", "_pool")
+
+    def __init__(self, image: np.ndarray, width: int, height: int, buffer=None, pool: Optional[FramePool] = None):
+        self.image = image
+        self.width = width
+        self.height = height
+        self._buffer = buffer
+        self._pool = pool
+
+    def to_original(self, det: DetectionArrays) -> DetectionArrays:
+        """Detections on `image` in original image coordinates"""
+        if len(det) == 0:
+            return det
+        height, width = self.image.shape[:2]
+        scale = np.array(
+            [self.width / width, self.height / height, self.width / width, self.height / height], np.float32
+        )
+        xyxy = det.xyxy * scale
+        np.clip(xyxy[:, 0::2], 0, self.width, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, self.height, out=xyxy[:, 1::2])
+        return DetectionArrays(xyxy, det.conf, det.cls)
+
+    def release(self):
+        if self._buffer is not None and self._pool is not None:
+            self._pool.release(self._buffer)
+        self._buffer = None
+
+
+def prepare(data, pool: FramePool) -> Optional[Letterbox]:
+    """Decode uploaded bytes straight to `pool.size` (blocking); None if not an image"""
+    image, (width, height) = decode_reduced(data, pool.size)
+    if image is None:
+        return None
+    buffer = pool.acquire()
+    view = letterbox_into(image, buffer, pool.size)
+    if view is image:
+        # Already the input size; the buffer isn't needed
+        pool.release(buffer)
+        buffer = None
+    return Letterbox(view, width, height, buffer, pool)
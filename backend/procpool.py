@@ -0,0 +1,302 @@
+# procpool.py
+"""
+Multi-process model worker pool with shared-memory frame hand-off.
+
+Each worker process owns one YOLO instance plus two shared-memory ring
+buffers: an input ring the API process copies frames into, and an output
+ring the worker writes detections into. Only small descriptor tuples
+cross the pipe, never pickled arrays.
+"""
+
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+# Detection rows written by workers: x1, y1, x2, y2, confidence, class_id
+DETECTION_FIELDS = 6
+
+
+def _worker_main(
+    model_path: str,
+    conn,
+    in_name: str,
+    out_name: str,
+    slot_bytes: int,
+    num_slots: int,
+    max_detections: int,
+    torch_threads: int,
+    engine: str,
+):
+    """Worker process entry point: load the model, then serve descriptors until told to stop"""
+    import torch
+
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+
+    from loader import load_model, warmup
+
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    model = images = results = None
+    try:
+        in_ring = np.ndarray((num_slots, slot_bytes), dtype=np.uint8, buffer=in_shm.buf)
+        out_ring = np.ndarray(
+            (num_slots, max_detections, DETECTION_FIELDS), dtype=np.float32, buffer=out_shm.buf
+        )
+
+        try:
+            model = load_model(model_path, engine)
+            warmup(model)
+        except Exception as e:
+            conn.send(("error", repr(e)))
+            return
+        conn.send(("ready", dict(model.names)))
+
+        stopping = False
+        while not stopping:
+            msg = conn.recv()
+            if msg is None:
+                break
+            # Drain whatever else is already queued so it runs as one batch
+            batch = [msg]
+            while len(batch) < num_slots and conn.poll():
+                msg = conn.recv()
+                if msg is None:
+                    stopping = True
+                    break
+                batch.append(msg)
+
+            try:
+                images = []
+                for _, slot, shape, _ in batch:
+                    nbytes = int(np.prod(shape))
+                    images.append(in_ring[slot, :nbytes].reshape(shape))
+                min_conf = min(conf for _, _, _, conf in batch)
+                results = model(images, conf=min_conf, verbose=False)
+
+                for (req_id, slot, _, conf), result in zip(batch, results):
+                    det = result.boxes.data.cpu().numpy().astype(np.float32, copy=False)
+                    det = det[det[:, 4] >= conf][:max_detections]
+                    out_ring[slot, :len(det)] = det
+                    conn.send((req_id, slot, len(det), None))
+            except Exception as e:
+                for req_id, slot, _, _ in batch:
+                    conn.send((req_id, slot, 0, repr(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # Views into the rings (including the predictor's last batch) must go first
+        model = images = results = in_ring = out_ring = None
+        in_shm.close()
+        out_shm.close()
+
+
+class _Worker:
+    """API-side handle for one worker process and its ring buffers"""
+
+    def __init__(self, ctx, index: int, slot_bytes: int, num_slots: int, max_detections: int):
+        self.index = index
+        self.in_shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+        self.out_shm = shared_memory.SharedMemory(
+            create=True, size=num_slots * max_detections * DETECTION_FIELDS * 4
+        )
+        self.in_ring = np.ndarray((num_slots, slot_bytes), dtype=np.uint8, buffer=self.in_shm.buf)
+        self.out_ring = np.ndarray(
+            (num_slots, max_detections, DETECTION_FIELDS), dtype=np.float32, buffer=self.out_shm.buf
+        )
+        self.free_slots: "queue.Queue[int]" = queue.Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+        self.conn, self.child_conn = ctx.Pipe()
+        self.send_lock = threading.Lock()
+        self.pending: Dict[int, Tuple[Future, int]] = {}
+        self.process = None
+        self.reader = None
+        self.alive = False
+        self.served = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.pending)
+
+
+class SharedMemoryModelPool:
+    """
+    Drop-in replacement for an in-process YOLO model backed by N worker processes.
+
+    Calling the pool like a model (``pool(images, conf=...)``) fans the images
+    out over the workers and returns ultralytics Results, so the rest of the
+    API does not need to know which mode is active.
+
+    Args:
+        model_path: Checkpoint each worker loads
+        num_workers: Number of model worker processes
+        slots_per_worker: Ring buffer depth (frames in flight) per worker
+        slot_mb: Largest frame, in MiB, a slot can hold
+        max_detections: Detections kept per frame
+        torch_threads: Intra-op threads per worker (0 = split the CPU cores evenly)
+        engine: Inference engine the workers load (see loader.ENGINES); exported
+            artifacts should already exist so workers don't all export at once
+    """
+
+    def __init__(
+        self,
+        model_path: Union[str, Path],
+        num_workers: int = 2,
+        slots_per_worker: int = 4,
+        slot_mb: float = 8.0,
+        max_detections: int = 300,
+        torch_threads: int = 0,
+        engine: str = "pytorch",
+    ):
+        self.model_path = str(model_path)
+        self.engine = engine
+        self.num_workers = max(1, int(num_workers))
+        self.slots_per_worker = max(1, int(slots_per_worker))
+        self.slot_bytes = int(slot_mb * 1024 * 1024)
+        self.max_detections = int(max_detections)
+        if torch_threads <= 0:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.torch_threads = torch_threads
+        self.names: Dict[int, str] = {}
+        self._workers: List[_Worker] = []
+        self._ids = itertools.count()
+        self._ctx = mp.get_context("spawn")
+
+    def start(self, timeout: float = 300.0):
+        """Spawn the workers and wait until every one has loaded the model"""
+        for index in range(self.num_workers):
+            worker = _Worker(
+                self._ctx, index, self.slot_bytes, self.slots_per_worker, self.max_detections
+            )
+            worker.process = self._ctx.Process(
+                target=_worker_main,
+                args=(
+                    self.model_path,
+                    worker.child_conn,
+                    worker.in_shm.name,
+                    worker.out_shm.name,
+                    self.slot_bytes,
+                    self.slots_per_worker,
+                    self.max_detections,
+                    self.torch_threads,
+                    self.engine,
+                ),
+                name=f"model-worker-{index}",
+                daemon=True,
+            )
+            worker.process.start()
+            self._workers.append(worker)
+
+        for worker in self._workers:
+            if not worker.conn.poll(timeout):
+                self.close()
+                raise RuntimeError(f"Model worker {worker.index} did not start within {timeout}s")
+            status, payload = worker.conn.recv()
+            if status != "ready":
+                self.close()
+                raise RuntimeError(f"Model worker {worker.index} failed to load model: {payload}")
+            self.names = payload
+            worker.alive = True
+            worker.reader = threading.Thread(
+                target=self._read_replies, args=(worker,), name=f"model-worker-{worker.index}-reader",
+                daemon=True,
+            )
+            worker.reader.start()
+
+    def _read_replies(self, worker: _Worker):
+        """Resolve futures as detections come back from one worker"""
+        while True:
+            try:
+                req_id, slot, count, error = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            future, _ = worker.pending.pop(req_id, (None, None))
+            if error is None:
+                detections = worker.out_ring[slot, :count].copy()
+            worker.free_slots.put(slot)
+            worker.served += 1
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(detections)
+            else:
+                future.set_exception(RuntimeError(f"Model worker {worker.index}: {error}"))
+
+        worker.alive = False
+        for future, _ in list(worker.pending.values()):
+            if not future.done():
+                future.set_exception(RuntimeError(f"Model worker {worker.index} exited"))
+        worker.pending.clear()
+
+    def submit(self, image: np.ndarray, confidence: float) -> Future:
+        """Copy one frame into a free slot and send its descriptor; resolves to an (N, 6) array"""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(
+                f"Frame of {image.nbytes} bytes exceeds worker slot size of {self.slot_bytes} bytes"
+            )
+        candidates = [w for w in self._workers if w.alive]
+        if not candidates:
+            raise RuntimeError("No model workers are running")
+        worker = min(candidates, key=lambda w: w.in_flight)
+
+        slot = worker.free_slots.get()  # blocks while this worker's ring is full
+        worker.in_ring[slot, :image.nbytes] = image.reshape(-1)
+        future: Future = Future()
+        req_id = next(self._ids)
+        worker.pending[req_id] = (future, slot)
+        try:
+            with worker.send_lock:
+                worker.conn.send((req_id, slot, image.shape, float(confidence)))
+        except Exception:
+            worker.pending.pop(req_id, None)
+            worker.free_slots.put(slot)
+            raise
+        return future
+
+    def __call__(self, source, conf: float = 0.25, **kwargs):
+        """Run detection like ``YOLO.__call__`` and return a list of Results"""
+        from detections import to_results
+
+        images = source if isinstance(source, (list, tuple)) else [source]
+        futures = [self.submit(img, conf) for img in images]
+        return [to_results(img, future.result(), self.names) for img, future in zip(images, futures)]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.num_workers,
+            "alive": sum(1 for w in self._workers if w.alive),
+            "torch_threads_per_worker": self.torch_threads,
+            "engine": self.engine,
+            "in_flight": [w.in_flight for w in self._workers],
+            "served": [w.served for w in self._workers],
+        }
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            worker.conn.close()
+            worker.in_ring = worker.out_ring = None
+            for shm in (worker.in_shm, worker.out_shm):
+                shm.close()
+                shm.unlink()
+        self._workers = []
@@ -0,0 +1,258 @@
+# registry.py
+"""
+Named model registry with lazy loading and a memory budget.
+
+Each model name maps to a weights file. A model is loaded the first time a
+request asks for it; concurrent first requests wait on the same load instead
+of loading it twice. Resident models are kept in LRU order, and after each
+load the least recently used ones are evicted until the estimated total fits
+the budget again. Models that are in use (acquired and not yet released) and
+the pinned default model are never evicted, so the budget can be exceeded
+temporarily when everything resident is busy.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loader import supports_imgsz
+from metrics import observe_model_call
+
+
+class UnknownModelError(KeyError):
+    """Raised when a request names a model that isn't registered"""
+
+    def __init__(self, name: str, available: List[str]):
+        super().__init__(name)
+        self.name = name
+        self.available = available
+
+    def __str__(self) -> str:
+        return f"Unknown model '{self.name}', available: {self.available}"
+
+
+class ModelEntry:
+    """
+    One resident model and its per-model state.
+
+    `model` is anything callable like ``YOLO.__call__`` with a `names` mapping
+    (an in-process YOLO, or a SharedMemoryModelPool, which handles its own
+    concurrency). `batcher` is attached by the registry's `start` hook.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        model: Any,
+        engine: str,
+        nbytes: int,
+        fingerprint: str,
+        concurrent: bool = False,
+        info: Optional[Dict] = None,
+    ):
+        self.name = name
+        self.path = Path(path)
+        self.model = model
+        self.engine = engine
+        self.nbytes = nbytes
+        # Result cache key component: weights hash plus engine
+        self.fingerprint = f"{fingerprint}:{engine}"
+        self.concurrent = concurrent
+        self.info = info or {}
+        self.batcher = None
+        self.refs = 0
+        self.pinned = False
+        self.loaded_at = time.time()
+        self.last_used = time.time()
+        # The ultralytics predictor keeps per-call state, so only one forward pass may run at a time
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    def run(self, source, **kwargs):
+        """
+        Call the model. In-process calls are serialized; a worker pool handles
+        its own concurrency, so calls to it run in parallel.
+        """
+        if not supports_imgsz(self.engine):
+            # Static exported graphs (TorchScript) have a fixed input size
+            kwargs.pop("imgsz", None)
+        batch_size = len(source) if isinstance(source, (list, tuple)) else 1
+        if self.concurrent:
+            start = time.perf_counter()
+            results = self.model(source, **kwargs)
+            observe_model_call(self.name, results, time.perf_counter() - start, 0.0, batch_size)
+            return results
+        waited = time.perf_counter()
+        with self._lock:
+            start = time.perf_counter()
+            results = self.model(source, **kwargs)
+        observe_model_call(self.name, results, time.perf_counter() - start, start - waited, batch_size)
+        return results
+
+    def predict_batch(self, images: List, confidence: float):
+        """Run one batched forward pass"""
+        return self.run(images, conf=confidence)
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "path": str(self.path),
+            "engine": self.engine,
+            "memory_mb": round(self.nbytes / (1024 * 1024), 2),
+            "in_use": self.refs,
+            "pinned": self.pinned,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+            **self.info,
+        }
+
+
+class ModelRegistry:
+    """
+    Args:
+        paths: Model name -> weights path for every model that may be requested
+        default: Name used when a request doesn't pick one; pinned once loaded
+        budget_bytes: Estimated memory all resident models may use
+        load: Blocking callable(name, path) -> ModelEntry, run in a thread
+        start: Optional coroutine function(entry) run on the event loop after loading
+        stop: Optional coroutine function(entry) run when an entry is evicted or closed
+    """
+
+    def __init__(
+        self,
+        paths: Dict[str, Path],
+        default: str,
+        budget_bytes: int,
+        load: Callable[[str, Path], ModelEntry],
+        start: Optional[Callable[[ModelEntry], Awaitable[None]]] = None,
+        stop: Optional[Callable[[ModelEntry], Awaitable[None]]] = None,
+    ):
+        self.paths = {name: Path(path) for name, path in paths.items()}
+        self.default_name = default
+        self.budget_bytes = budget_bytes
+        self._load = load
+        self._start = start
+        self._stop = stop
+        self._resident: "OrderedDict[str, ModelEntry]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Callers waiting on a load, per model; a just-loaded model they wait for isn't evicted
+        self._waiters: Dict[str, int] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def available(self) -> List[str]:
+        return sorted(self.paths)
+
+    @property
+    def default(self) -> Optional[ModelEntry]:
+        """The default model if it is loaded"""
+        return self._resident.get(self.default_name)
+
+    @property
+    def resident(self) -> List[ModelEntry]:
+        """Loaded models, least recently used first"""
+        return list(self._resident.values())
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._resident.values())
+
+    def is_loading(self, name: Optional[str] = None) -> bool:
+        return (name or self.default_name) in self._loading
+
+    def get(self, name: Optional[str] = None) -> Optional[ModelEntry]:
+        """A resident model without loading or acquiring it"""
+        return self._resident.get(name or self.default_name)
+
+    async def acquire(self, name: Optional[str] = None) -> ModelEntry:
+        """
+        Return the named (or default) model, loading it if needed, and mark it in
+        use until `release`. Raises UnknownModelError for unregistered names.
+        """
+        name = name or self.default_name
+        if name not in self.paths:
+            raise UnknownModelError(name, self.available)
+
+        # Another model's load may evict this one between its load finishing and this
+        # caller resuming, so only an entry that is resident right now is handed out
+        entry = self._resident.get(name)
+        while entry is None:
+            loading = self._loading.get(name)
+            if loading is None:
+                loading = asyncio.get_running_loop().create_future()
+                self._loading[name] = loading
+                asyncio.create_task(self._load_entry(name, loading))
+            self._waiters[name] = self._waiters.get(name, 0) + 1
+            try:
+                # shield: one caller giving up must not cancel the load for the others
+                await asyncio.shield(loading)
+            finally:
+                self._waiters[name] -= 1
+                if not self._waiters[name]:
+                    del self._waiters[name]
+            entry = self._resident.get(name)
+
+        entry.refs += 1
+        entry.last_used = time.time()
+        self._resident.move_to_end(name)
+        return entry
+
+    def release(self, entry: ModelEntry):
+        entry.refs = max(0, entry.refs - 1)
+        entry.last_used = time.time()
+
+    async def _load_entry(self, name: str, loading: asyncio.Future):
+        try:
+            entry = await asyncio.to_thread(self._load, name, self.paths[name])
+            if self._start is not None:
+                await self._start(entry)
+            entry.pinned = name == self.default_name
+            self._resident[name] = entry
+            self.loads += 1
+            loading.set_result(entry)
+        except Exception as e:
+            loading.set_exception(e)
+            # Nobody may be waiting any more; don't log "exception never retrieved"
+            loading.exception()
+        finally:
+            self._loading.pop(name, None)
+        await self._evict(keep=name)
+
+    async def _evict(self, keep: str):
+        """Drop least recently used idle models until the budget is met"""
+        for name, entry in list(self._resident.items()):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            if name == keep or entry.pinned or entry.refs > 0 or name in self._waiters:
+                continue
+            del self._resident[name]
+            self.evictions += 1
+            if self._stop is not None:
+                await self._stop(entry)
+
+    async def close(self):
+        for name in list(self._resident):
+            entry = self._resident.pop(name)
+            if self._stop is not None:
+                await self._stop(entry)
+
+    def stats(self) -> Dict:
+        return {
+            "default": self.default_name,
+            "available": self.available,
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 2),
+            "resident_mb": round(self.resident_bytes / (1024 * 1024), 2),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "resident": [entry.stats() for entry in self.resident],
+            "loading": sorted(self._loading),
+        }
@@ -0,0 +1,85 @@
+# render.py
+"""
+Deferred annotation for detections-only requests.
+
+Instead of plotting and encoding an annotated image on every request, the
+server keeps the untouched upload plus a compact detection record
+(``detections_<timestamp>_<file_id>.npz``). The annotated image is drawn the
+first time it is downloaded, written next to the record and reused afterwards.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Mapping, Optional
+
+import cv2
+import numpy as np
+
+from detections import to_results
+
+RECORD_PREFIX = "detections_"
+SOURCE_PREFIX = "source_"
+OUTPUT_PREFIX = "detection_"
+
+
+def record_filename(timestamp: str, file_id: str) -> str:
+    return f"{RECORD_PREFIX}{timestamp}_{file_id}.npz"
+
+
+def source_filename(timestamp: str, file_id: str, ext: str) -> str:
+    return f"{SOURCE_PREFIX}{timestamp}_{file_id}{ext}"
+
+
+def is_record(path: Path) -> bool:
+    return path.name.startswith(RECORD_PREFIX) and path.suffix == ".npz"
+
+
+def save_record(path: Path, rows: np.ndarray, source_name: str, names: Optional[Mapping[int, str]] = None):
+    """
+    Write (N, 6) detection rows and the name of the stored upload they belong to,
+    plus the class names of the model that produced them
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    extra = {"names": np.array(json.dumps({str(k): v for k, v in names.items()}))} if names else {}
+    with open(tmp, "wb") as f:
+        np.savez(f, boxes=rows.astype(np.float32, copy=False), source=np.array(source_name), **extra)
+    os.replace(tmp, path)
+
+
+def output_path_for(record_path: Path, source_name: str) -> Path:
+    """Where the rendered image for a record goes: detection_<timestamp>_<file_id><ext>"""
+    stem = record_path.stem[len(RECORD_PREFIX):]
+    return record_path.with_name(f"{OUTPUT_PREFIX}{stem}{Path(source_name).suffix}")
+
+
+def render_record(record_path: Path, names: Optional[Mapping[int, str]] = None) -> Optional[Path]:
+    """
+    Draw the stored detections onto the stored upload and write the annotated image
+    (blocking). Returns its path, or None if the upload is no longer available.
+    The upload is deleted once the annotated image exists. `names` is used for
+    records written without class names; without either, boxes are labelled by class id.
+    """
+    with np.load(record_path, allow_pickle=False) as record:
+        rows = record["boxes"]
+        source_name = str(record["source"])
+        if "names" in record.files:
+            names = {int(k): v for k, v in json.loads(str(record["names"])).items()}
+    if names is None:
+        names = {int(c): str(int(c)) for c in rows[:, 5]}
+
+    output_path = output_path_for(record_path, source_name)
+    if output_path.exists():
+        return output_path
+
+    source_path = record_path.with_name(source_name)
+    image = cv2.imread(str(source_path), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    annotated = to_results(image, rows, names).plot()
+    tmp = output_path.with_name(output_path.stem + ".tmp" + output_path.suffix)
+    cv2.imwrite(str(tmp), annotated)
+    os.replace(tmp, output_path)
+    source_path.unlink(missing_ok=True)
+    return output_path
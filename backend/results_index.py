@@ -0,0 +1,220 @@
+# results_index.py
+"""
+Persistent index of the files in the results directory.
+
+Every file the API writes there (annotated images and videos, detection
+records, kept uploads, disk cache entries) is recorded in a SQLite database
+with its file id, kind, size and expiry time. Downloads look a file id up
+through an index instead of globbing the directory, and a background reaper
+deletes what has expired by walking the expiry index from the oldest entry,
+so neither cost grows with the number of stored results.
+
+The database runs in WAL mode, so several API processes can share it: reads
+don't block each other or the writer. Each reaper claims expired rows with a
+single DELETE ... RETURNING, so two processes never reap the same file twice.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+KIND_IMAGE = "image"
+KIND_VIDEO = "video"
+KIND_RECORD = "record"
+KIND_SOURCE = "source"
+KIND_CACHE = "cache"
+KIND_TEMP = "temp"
+
+# Kinds /download serves, best first: a rendered image beats the record it came from
+SERVED_KINDS = (KIND_IMAGE, KIND_VIDEO, KIND_RECORD)
+
+INDEX_FILENAME = ".results.db"
+
+# temp_ files are uploads still being processed, possibly by another process sharing the
+# directory; adopt only ones untouched for far longer than any video job can run
+TEMP_ADOPT_AGE = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    file_id TEXT,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_file_id ON files (file_id);
+CREATE INDEX IF NOT EXISTS files_expires ON files (expires);
+"""
+
+# <prefix>_<timestamp>_<uuid><ext>, as written by the API
+_UUID_SUFFIX = re.compile(r"_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$")
+
+
+def guess_kind(name: str) -> str:
+    """Kind of a results file from its name (for files written before the index existed)"""
+    if name.startswith("cache_"):
+        return KIND_CACHE
+    if name.startswith("source_"):
+        return KIND_SOURCE
+    if name.startswith("temp_"):
+        return KIND_TEMP
+    if name.startswith("detections_"):
+        return KIND_RECORD
+    if name.endswith(".mp4"):
+        return KIND_VIDEO
+    return KIND_IMAGE
+
+
+def guess_file_id(name: str) -> Optional[str]:
+    match = _UUID_SUFFIX.search(Path(name).stem)
+    return match.group(1) if match else None
+
+
+class ResultIndex:
+    """
+    Args:
+        results_dir: Directory the indexed files live in (names are relative to it)
+        ttl_seconds: Default lifetime of a file from when it is added or touched
+        db_path: SQLite database (default: a hidden file in results_dir)
+    """
+
+    def __init__(self, results_dir: Path, ttl_seconds: float, db_path: Optional[Path] = None):
+        self.results_dir = Path(results_dir)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = Path(db_path) if db_path else self.results_dir / INDEX_FILENAME
+        self._local = threading.local()
+        self.reaped = 0
+        self.reaped_bytes = 0
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, so every statement is its own transaction"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps the database consistent without an fsync per commit
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def add(self, name: str, file_id: Optional[str], kind: str, ttl_seconds: Optional[float] = None):
+        """Record a file that now exists in the results directory"""
+        self.add_many([(name, file_id, kind)], ttl_seconds)
+
+    def add_many(self, files: Sequence[Tuple[str, Optional[str], str]], ttl_seconds: Optional[float] = None):
+        """Record several (name, file_id, kind) files in one transaction"""
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        rows = []
+        for name, file_id, kind in files:
+            try:
+                size = (self.results_dir / name).stat().st_size
+            except OSError:
+                size = 0
+            rows.append((name, file_id, kind, size, now, now + ttl))
+        db = self._connect()
+        # The connection autocommits; one explicit transaction for the batch (committed or rolled back by `with`)
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR REPLACE INTO files (name, file_id, kind, size, created, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def lookup(self, file_id: str) -> Optional[str]:
+        """Name of the file /download should serve for `file_id`, or None"""
+        placeholders = ",".join("?" * len(SERVED_KINDS))
+        order = " ".join(f"WHEN ? THEN {i}" for i in range(len(SERVED_KINDS)))
+        row = self._connect().execute(
+            f"SELECT name FROM files WHERE file_id = ? AND kind IN ({placeholders}) "
+            f"ORDER BY CASE kind {order} END LIMIT 1",
+            (file_id, *SERVED_KINDS, *SERVED_KINDS),
+        ).fetchone()
+        return row[0] if row else None
+
+    def touch(self, file_id: str, ttl_seconds: Optional[float] = None):
+        """Push back the expiry of every file of `file_id` (e.g. on a cache hit)"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._connect().execute(
+            "UPDATE files SET expires = MAX(expires, ?) WHERE file_id = ?", (time.time() + ttl, file_id)
+        )
+
+    def forget(self, name: str):
+        """Drop the row for a file that is already gone"""
+        self._connect().execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def reap(self, batch_size: int = 500) -> int:
+        """Delete expired files, oldest first, in batches (blocking). Returns how many were removed."""
+        removed = 0
+        while True:
+            rows: List = self._connect().execute(
+                "DELETE FROM files WHERE name IN "
+                "(SELECT name FROM files WHERE expires <= ? ORDER BY expires LIMIT ?) "
+                "RETURNING name, size",
+                (time.time(), batch_size),
+            ).fetchall()
+            for name, size in rows:
+                try:
+                    os.remove(self.results_dir / name)
+                    self.reaped_bytes += size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Cleanup error: {e}")
+            removed += len(rows)
+            if len(rows) < batch_size:
+                break
+        self.reaped += removed
+        return removed
+
+    def adopt(self, temp_min_age: float = TEMP_ADOPT_AGE) -> int:
+        """
+        Index files that are in the results directory but not in the index (files from
+        before the index existed, or left behind by a crash), expiring ttl after their
+        last modification. In-flight temp_ files are left alone until `temp_min_age`
+        seconds after their last modification. Scans the directory once; meant for startup.
+        """
+        db = self._connect()
+        known = {row[0] for row in db.execute("SELECT name FROM files")}
+        rows = []
+        now = time.time()
+        with os.scandir(self.results_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(INDEX_FILENAME) or entry.name in known or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if guess_kind(entry.name) == KIND_TEMP and now - stat.st_mtime < temp_min_age:
+                    continue
+                rows.append((
+                    entry.name,
+                    guess_file_id(entry.name),
+                    guess_kind(entry.name),
+                    stat.st_size,
+                    stat.st_mtime,
+                    stat.st_mtime + self.ttl_seconds,
+                ))
+        db.executemany(
+            "INSERT OR IGNORE INTO files (name, file_id, kind, size, created, expires) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        return len(rows)
+
+    def stats(self) -> Dict:
+        count, size, next_expiry = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(expires) FROM files"
+        ).fetchone()
+        return {
+            "files": count,
+            "bytes": size,
+            "next_expiry_in_s": round(next_expiry - time.time(), 1) if next_expiry is not None else None,
+            "ttl_s": self.ttl_seconds,
+            "reaped": self.reaped,
+            "reaped_bytes": self.reaped_bytes,
+        }
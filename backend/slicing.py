@@ -0,0 +1,157 @@
+# slicing.py
+"""
+Sliced (tiled) inference for high-resolution images.
+
+Feeding a 6000 px image to the model letterboxes it down to the model input
+size, which shrinks small objects to a few pixels. Instead the image is cut
+into overlapping tiles at the model's native size, the tiles are run in
+batches, and the per-tile boxes are shifted back to image coordinates and
+merged across tiles.
+
+Tiles are NumPy views into the decoded image, so slicing copies nothing.
+Optionally the whole image, downscaled to one tile, is run as well so objects
+larger than a tile are still found in one piece.
+
+Merging is class-aware and greedy, highest score first. A box "matches" an
+earlier kept box when their intersection over the *smaller* box reaches the
+threshold; that catches an object cut in two by a tile edge, whose halves
+have a low IoU with the whole. Matches are then either suppressed (nms) or
+merged into the enclosing box, keeping the best score (fuse).
+"""
+
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from detections import extract, to_rows
+
+MERGE_NMS = "nms"
+MERGE_FUSE = "fuse"
+MERGE_METHODS = (MERGE_NMS, MERGE_FUSE)
+
+
+def tile_origins(length: int, tile: int, overlap: float) -> List[int]:
+    """Start offsets along one axis so tiles of `tile` px cover `length` with at least `overlap` shared"""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    origins = list(range(0, length - tile, stride))
+    # Last tile flush with the edge instead of hanging off it
+    origins.append(length - tile)
+    return origins
+
+
+def slice_image(image: np.ndarray, tile: int, overlap: float) -> List[Tuple[int, int, np.ndarray]]:
+    """(x, y, view) for every tile of the image"""
+    height, width = image.shape[:2]
+    return [
+        (x, y, image[y:y + tile, x:x + tile])
+        for y in tile_origins(height, tile, overlap)
+        for x in tile_origins(width, tile, overlap)
+    ]
+
+
+def _intersection_over_smaller(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    tl = np.maximum(box[:2], boxes[:, :2])
+    br = np.minimum(box[2:], boxes[:, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=1)
+    area = np.prod(np.clip(box[2:] - box[:2], 0, None))
+    areas = np.prod(np.clip(boxes[:, 2:] - boxes[:, :2], 0, None), axis=1)
+    smaller = np.minimum(area, areas)
+    return np.where(smaller > 0, inter / np.maximum(smaller, 1e-9), 0.0)
+
+
+def merge_rows(rows: np.ndarray, method: str = MERGE_NMS, threshold: float = 0.5) -> np.ndarray:
+    """Merge (N, 6) x1, y1, x2, y2, conf, cls rows from overlapping tiles (see module docstring)"""
+    if len(rows) < 2:
+        return rows
+    merged = []
+    for cls in np.unique(rows[:, 5]):
+        group = rows[rows[:, 5] == cls]
+        group = group[np.argsort(-group[:, 4], kind="stable")]
+        while len(group):
+            best = group[0].copy()
+            rest = group[1:]
+            matched = _intersection_over_smaller(best[:4], rest[:, :4]) >= threshold
+            # Fusing grows the box, which can reach pieces from further tiles
+            while method == MERGE_FUSE and matched.any():
+                members = rest[matched]
+                best[:2] = np.minimum(best[:2], members[:, :2].min(axis=0))
+                best[2:4] = np.maximum(best[2:4], members[:, 2:4].max(axis=0))
+                rest = rest[~matched]
+                matched = _intersection_over_smaller(best[:4], rest[:, :4]) >= threshold
+            merged.append(best)
+            group = rest[~matched]
+    return np.stack(merged).astype(np.float32, copy=False)
+
+
+def detect_sliced(
+    image: np.ndarray,
+    predict_batch: Callable[[List[np.ndarray], float], Sequence],
+    confidence: float,
+    tile_size: int = 640,
+    overlap: float = 0.2,
+    batch_size: int = 8,
+    merge: str = MERGE_NMS,
+    merge_threshold: float = 0.5,
+    full_image: bool = True,
+) -> Tuple[np.ndarray, Dict]:
+    """
+    Run the model over overlapping tiles of `image` (blocking).
+
+    `predict_batch(images, confidence)` returns one Results per image; a model
+    worker pool spreads each batch over its workers. Returns merged (N, 6)
+    rows in image coordinates and timing stats.
+    """
+    if merge not in MERGE_METHODS:
+        raise ValueError(f"merge must be one of {list(MERGE_METHODS)}")
+    start = time.perf_counter()
+    tiles = slice_image(image, tile_size, overlap)
+    inputs = [(x, y, 1.0, view) for x, y, view in tiles]
+
+    height, width = image.shape[:2]
+    if full_image and len(tiles) > 1:
+        # The model would letterbox it to about this size anyway
+        scale = tile_size / max(height, width)
+        thumbnail = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        inputs.append((0, 0, scale, thumbnail))
+
+    parts = []
+    batch_ms = []
+    for i in range(0, len(inputs), batch_size):
+        batch = inputs[i:i + batch_size]
+        batch_start = time.perf_counter()
+        results = predict_batch([view for _, _, _, view in batch], confidence)
+        batch_ms.append((time.perf_counter() - batch_start) * 1000)
+        for (x, y, scale, _), result in zip(batch, results):
+            rows = to_rows(extract(result))
+            rows[:, :4] /= scale
+            rows[:, [0, 2]] += x
+            rows[:, [1, 3]] += y
+            parts.append(rows)
+
+    merge_start = time.perf_counter()
+    rows = np.concatenate(parts) if parts else np.empty((0, 6), np.float32)
+    merged = merge_rows(rows, merge, merge_threshold)
+    merge_ms = (time.perf_counter() - merge_start) * 1000
+
+    inference_ms = sum(batch_ms)
+    return merged, {
+        "tiles": len(tiles),
+        "full_image_pass": len(inputs) > len(tiles),
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "batch_size": batch_size,
+        "batches": len(batch_ms),
+        "batch_ms": [round(ms, 1) for ms in batch_ms],
+        # Tiles share a forward pass, so only batches are timed; this is their mean cost per tile
+        "avg_tile_ms": round(inference_ms / len(inputs), 2),
+        "inference_ms": round(inference_ms, 1),
+        "merge": merge,
+        "boxes_before_merge": len(rows),
+        "boxes_after_merge": len(merged),
+        "merge_ms": round(merge_ms, 2),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,71 @@
+# stream_protocol.py
+"""
+Binary frame protocol for the live detection WebSocket.
+
+Negotiated with the WebSocket subprotocol ``yolo.binary.v1``. After a JSON
+text "hello" message carrying the class names, every frame is a single
+binary message (all little-endian):
+
+    header      20 bytes   magic b"YD", version u8, flags u8, seq u32,
+                           timestamp f64 (unix seconds), count u32
+    detections  22 bytes   class_id u16, score f32, x1 f32, y1 f32, x2 f32, y2 f32
+                each       (repeated `count` times)
+    image       rest       JPEG bytes of the annotated frame
+
+Decoding only needs the standard library, so clients don't need NumPy.
+"""
+
+import struct
+from typing import Dict, List, Tuple
+
+BINARY_SUBPROTOCOL = "yolo.binary.v1"
+MAGIC = b"YD"
+VERSION = 1
+
+HEADER = struct.Struct("<2sBBIdI")
+DETECTION = struct.Struct("<Hfffff")
+
+
+def encode_frame(seq: int, timestamp: float, det, jpeg: bytes) -> bytes:
+    """Pack one frame; `det` is a detections.DetectionArrays"""
+    import numpy as np
+
+    count = len(det)
+    records = np.empty(
+        count,
+        dtype=np.dtype([("cls", "<u2"), ("score", "<f4"), ("box", "<f4", (4,))]),
+    )
+    records["cls"] = det.cls
+    records["score"] = det.conf
+    records["box"] = det.xyxy
+    return b"".join((
+        HEADER.pack(MAGIC, VERSION, 0, seq & 0xFFFFFFFF, timestamp, count),
+        records.tobytes(),
+        jpeg,
+    ))
+
+
+def decode_frame(data: bytes) -> Tuple[int, float, List[Tuple], bytes]:
+    """
+    Unpack one frame into (seq, timestamp, detections, jpeg), where each
+    detection is a (class_id, score, x1, y1, x2, y2) tuple.
+    """
+    magic, version, _, seq, timestamp, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported frame (magic={magic!r}, version={version})")
+    start = HEADER.size
+    end = start + count * DETECTION.size
+    detections = list(DETECTION.iter_unpack(data[start:end]))
+    return seq, timestamp, detections, data[end:]
+
+
+def to_stream_objects(detections: List[Tuple], class_names: Dict) -> List[Dict]:
+    """Turn decoded detections into the objects of the legacy JSON message"""
+    return [
+        {
+            "class": class_names.get(str(class_id), str(class_id)),
+            "confidence": score,
+            "bbox": [x1, y1, x2, y2],
+        }
+        for class_id, score, x1, y1, x2, y2 in detections
+    ]
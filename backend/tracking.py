@@ -0,0 +1,165 @@
+# tracking.py
+"""
+Lightweight multi-object tracking for keyframe-based video detection.
+
+The model only runs on keyframes. Every frame, each track's box is advanced
+with a constant-velocity Kalman filter (state: centre, size and their
+velocities); on keyframes the predictions are matched to the new detections
+by IoU (greedy, same class only) and corrected. Unmatched detections start
+new tracks, and tracks that go unmatched for `max_missed` keyframes are
+dropped. Track ids are stable for the life of a track.
+
+NumPy only, so it adds no dependencies and costs microseconds per frame.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+from detections import DetectionArrays
+
+# Constant-velocity model, one step per frame
+_F = np.eye(8, dtype=np.float64)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8, dtype=np.float64)
+
+
+def _xyxy_to_cxcywh(box: np.ndarray) -> np.ndarray:
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _cxcywh_to_xyxy(state: np.ndarray) -> np.ndarray:
+    cx, cy, w, h = state[:4]
+    w, h = max(w, 0.0), max(h, 0.0)
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(np.clip(a[:, 2:] - a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(b[:, 2:] - b[:, :2], 0, None), axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+class _Track:
+    """Kalman state for one object"""
+
+    def __init__(self, track_id: int, box: np.ndarray, conf: float, cls: int):
+        self.id = track_id
+        self.mean = np.zeros(8, dtype=np.float64)
+        self.mean[:4] = _xyxy_to_cxcywh(box)
+        w, h = max(self.mean[2], 1.0), max(self.mean[3], 1.0)
+        self.cov = np.diag([w, h, w, h, 10 * w, 10 * h, 10 * w, 10 * h]) ** 2 / 100
+        self.conf = conf
+        self.cls = cls
+        self.missed = 0
+
+    def _noise(self, scale: float) -> np.ndarray:
+        w, h = max(self.mean[2], 1.0), max(self.mean[3], 1.0)
+        return np.diag([w, h, w, h]) ** 2 * scale
+
+    def predict(self):
+        self.mean = _F @ self.mean
+        q = np.zeros((8, 8))
+        q[:4, :4] = self._noise(1e-3)
+        q[4:, 4:] = self._noise(1e-4)
+        self.cov = _F @ self.cov @ _F.T + q
+
+    def correct(self, box: np.ndarray, conf: float):
+        s = _H @ self.cov @ _H.T + self._noise(2.5e-3)
+        k = self.cov @ _H.T @ np.linalg.inv(s)
+        self.mean = self.mean + k @ (_xyxy_to_cxcywh(box) - _H @ self.mean)
+        self.cov = (np.eye(8) - k @ _H) @ self.cov
+        self.conf = conf
+        self.missed = 0
+
+    @property
+    def box(self) -> np.ndarray:
+        return _cxcywh_to_xyxy(self.mean)
+
+
+class KeyframeTracker:
+    """IoU + Kalman tracker fed with detections on keyframes only"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self._tracks: List[_Track] = []
+        self._next_id = 1
+
+    @property
+    def tracks_started(self) -> int:
+        return self._next_id - 1
+
+    def predict(self):
+        """Advance every track by one frame"""
+        for track in self._tracks:
+            track.predict()
+
+    def update(self, det: DetectionArrays) -> Tuple[DetectionArrays, np.ndarray]:
+        """
+        Match a keyframe's detections to the (already advanced) tracks.
+        Returns the detections in their original order plus their track ids.
+        """
+        boxes = det.xyxy.astype(np.float32, copy=False)
+        predicted = np.array([t.box for t in self._tracks], dtype=np.float32).reshape(-1, 4)
+        iou = iou_matrix(predicted, boxes)
+        if iou.size:
+            same_class = np.array([t.cls for t in self._tracks])[:, None] == det.cls[None, :]
+            iou = np.where(same_class, iou, 0.0)
+
+        ids = np.zeros(len(det), dtype=np.int64)
+        matched_tracks = set()
+        # Greedy assignment, best overlap first
+        for flat in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(flat, iou.shape)
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in matched_tracks or ids[d]:
+                continue
+            self._tracks[t].correct(boxes[d], float(det.conf[d]))
+            matched_tracks.add(t)
+            ids[d] = self._tracks[t].id
+
+        for t, track in enumerate(self._tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self._tracks = [t for t in self._tracks if t.missed <= self.max_missed]
+
+        for d in np.flatnonzero(ids == 0):
+            track = _Track(self._next_id, boxes[d], float(det.conf[d]), int(det.cls[d]))
+            self._next_id += 1
+            self._tracks.append(track)
+            ids[d] = track.id
+
+        return det, ids
+
+    def current(self) -> Tuple[DetectionArrays, np.ndarray]:
+        """Predicted boxes of the tracks matched on the last keyframe, for in-between frames"""
+        live = [t for t in self._tracks if t.missed == 0]
+        det = DetectionArrays(
+            np.array([t.box for t in live], dtype=np.float32).reshape(-1, 4),
+            np.array([t.conf for t in live], dtype=np.float32),
+            np.array([t.cls for t in live], dtype=np.int64),
+        )
+        return det, np.array([t.id for t in live], dtype=np.int64)
+
+
+def to_track_rows(det: DetectionArrays, ids: np.ndarray) -> np.ndarray:
+    """(N, 7) float32 rows of x1, y1, x2, y2, track_id, conf, cls (the tracked Boxes layout)"""
+    return np.concatenate(
+        [
+            det.xyxy.astype(np.float32, copy=False),
+            ids[:, None].astype(np.float32),
+            det.conf[:, None].astype(np.float32),
+            det.cls[:, None].astype(np.float32),
+        ],
+        axis=1,
+    )
@@ -0,0 +1,184 @@
+# uploads.py
+"""
+Streamed upload handling.
+
+Uploads are copied in fixed-size chunks to a spool file (videos) or to an
+anonymous temp file that is then memory-mapped (images), so peak memory per
+request stays flat regardless of upload size. Size limits are enforced while
+the body is still arriving, not after it has been buffered.
+"""
+
+import mmap
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+import aiofiles
+import numpy as np
+from fastapi import HTTPException, UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit",
+    )
+
+
+async def spool_upload(
+    file: UploadFile, dest: Path, max_bytes: int, chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Stream an upload to `dest` chunk by chunk and return the number of bytes written.
+    The partial file is removed if the upload goes over `max_bytes`.
+    """
+    written = 0
+    try:
+        async with aiofiles.open(dest, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                await out.write(chunk)
+    except BaseException:
+        Path(dest).unlink(missing_ok=True)
+        raise
+    return written
+
+
+class MappedUpload:
+    """Read-only memory map over a spooled upload; close() releases the map and the file"""
+
+    def __init__(self, fh, size: int):
+        self._fh = fh
+        self.size = size
+        self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def array(self) -> np.ndarray:
+        """Zero-copy uint8 view of the upload bytes"""
+        if self._mmap is None:
+            return np.empty(0, dtype=np.uint8)
+        return np.frombuffer(self._mmap, dtype=np.uint8)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still alive somewhere; the map is released when it is collected
+                pass
+            self._mmap = None
+        self._fh.close()
+
+
+async def spool_temp(
+    file: UploadFile,
+    max_bytes: int,
+    spool_dir: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[BinaryIO, int]:
+    """
+    Stream an upload into an anonymous temp file; returns it rewound, with its size.
+    The copy outlives the request's form data, which is closed once the endpoint returns.
+    """
+    fh = tempfile.TemporaryFile(dir=spool_dir)
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            fh.write(chunk)
+        fh.flush()
+        fh.seek(0)
+        return fh, size
+    except BaseException:
+        fh.close()
+        raise
+
+
+async def map_upload(
+    file: UploadFile,
+    max_bytes: int,
+    spool_dir: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> MappedUpload:
+    """Stream an upload into an anonymous temp file and memory-map it"""
+    fh, size = await spool_temp(file, max_bytes, spool_dir, chunk_size)
+    try:
+        return MappedUpload(fh, size)
+    except BaseException:
+        fh.close()
+        raise
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware enforcing per-path request body limits while the body streams in.
+
+    Requests that declare a larger Content-Length are rejected with 413 before any
+    body is read; chunked or mis-declared bodies fail as soon as they cross the limit.
+
+    Args:
+        limits: Path prefix -> maximum body size in bytes
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits.items():
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self._limit_for(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    break
+                if declared > limit:
+                    return await self._reject(send, limit)
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large(limit)
+            return message
+
+        return await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send, limit: int):
+        body = ('{"detail":"Upload exceeds the %d MB limit"}' % (limit // (1024 * 1024))).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})